@@ -1,26 +1,137 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Union
 
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from . import models, schemas, security
+from . import models, schemas, security, wheel_packing
+from .wheel_packing import PackedWheelPosition, packed_storage_enabled
+
+AnyWheelPosition = Union[models.WheelPosition, PackedWheelPosition]
 
 
 def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.username == username).first()
 
 
-def create_user(db: Session, user_in: schemas.UserCreate) -> models.User:
+def is_unique_violation(exc: IntegrityError, index_name: str, sqlite_columns: str) -> bool:
+    """Whether ``exc`` broke the unique key ``index_name``.
+
+    PostgreSQL reports the index name; SQLite only lists the columns, as
+    ``sqlite_columns`` (e.g. ``"vehicles.license_plate"``).
+    """
+    message = str(exc.orig)
+    return index_name in message or f"UNIQUE constraint failed: {sqlite_columns}" in message
+
+
+def count_users(db: Session) -> int:
+    return db.query(func.count(models.User.id)).scalar()
+
+
+def create_user(
+    db: Session, user_in: schemas.UserCreate, is_superuser: bool = False
+) -> models.User:
     hashed_password = security.get_password_hash(user_in.password)
-    db_user = models.User(username=user_in.username, hashed_password=hashed_password)
+    depot_id = user_in.depot_id or get_default_depot(db).id
+    db_user = models.User(
+        username=user_in.username,
+        hashed_password=hashed_password,
+        depot_id=depot_id,
+        is_superuser=is_superuser,
+    )
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
 
+def create_user_token(user: models.User) -> str:
+    return security.create_access_token(
+        subject=user.username,
+        claims={"uid": user.id, "depot": user.depot_id, "su": bool(user.is_superuser)},
+    )
+
+
+def revoke_token(db: Session, jti: str, expires_at: datetime) -> models.TokenRevocation:
+    revocation = models.TokenRevocation(
+        jti=jti, revoked_at=datetime.now(timezone.utc), expires_at=expires_at
+    )
+    db.add(revocation)
+    db.commit()
+    db.refresh(revocation)
+    security.revocations.revoke_token(jti, expires_at.timestamp())
+    return revocation
+
+
+def revoke_user_tokens(db: Session, user: models.User) -> models.TokenRevocation:
+    """Invalidate every token issued to ``user`` so far."""
+    revoked_at = datetime.now(timezone.utc)
+    expires_at = revoked_at + timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
+    revocation = models.TokenRevocation(
+        user_id=user.id, revoked_at=revoked_at, expires_at=expires_at
+    )
+    db.add(revocation)
+    db.commit()
+    db.refresh(revocation)
+    security.revocations.revoke_user(user.id, revoked_at.timestamp(), expires_at.timestamp())
+    return revocation
+
+
+def deactivate_user(db: Session, user: models.User) -> models.User:
+    user.is_active = False
+    db.commit()
+    revoke_user_tokens(db, user)
+    return user
+
+
+def sync_revocations(db: Session) -> int:
+    """Load every unexpired revocation into ``security.revocations``.
+
+    All live rows are re-read on each call rather than only those past an id
+    watermark: ids are allocated before commit, so a row can become visible
+    after one with a higher id and would be skipped forever. Pruning keeps the
+    live set small. Returns the number of entries that were new to this process.
+    """
+    rows = (
+        db.query(
+            models.TokenRevocation.jti,
+            models.TokenRevocation.user_id,
+            models.TokenRevocation.revoked_at,
+            models.TokenRevocation.expires_at,
+        )
+        .filter(models.TokenRevocation.expires_at > datetime.now(timezone.utc))
+        .all()
+    )
+    added = 0
+    for jti, user_id, revoked_at, expires_at in rows:
+        expires_at = _as_utc(expires_at).timestamp()
+        if jti:
+            added += security.revocations.revoke_token(jti, expires_at)
+        if user_id:
+            revoked_at = _as_utc(revoked_at).timestamp()
+            added += security.revocations.revoke_user(user_id, revoked_at, expires_at)
+    security.revocations.purge()
+    return added
+
+
+def prune_revocations(db: Session) -> int:
+    deleted = (
+        db.query(models.TokenRevocation)
+        .filter(models.TokenRevocation.expires_at <= datetime.now(timezone.utc))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes even for timezone-aware columns.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
 def authenticate_user(db: Session, username: str, password: str) -> Optional[models.User]:
     user = get_user_by_username(db, username)
     if not user or not security.verify_password(password, user.hashed_password):
@@ -28,16 +139,70 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[mod
     return user
 
 
-def list_vehicles(db: Session, search: Optional[str] = None) -> List[models.Vehicle]:
+def get_depot(db: Session, depot_id: int) -> Optional[models.Depot]:
+    return db.get(models.Depot, depot_id)
+
+
+def get_default_depot(db: Session) -> models.Depot:
+    depot = db.query(models.Depot).filter(models.Depot.code == schemas.DEFAULT_DEPOT_CODE).first()
+    if depot is None:
+        try:
+            depot = create_depot(db, schemas.DepotCreate(code=schemas.DEFAULT_DEPOT_CODE))
+        except IntegrityError:
+            # Created concurrently, e.g. by another worker's init_db.
+            db.rollback()
+            depot = (
+                db.query(models.Depot)
+                .filter(models.Depot.code == schemas.DEFAULT_DEPOT_CODE)
+                .one()
+            )
+    return depot
+
+
+def list_depots(db: Session) -> List[models.Depot]:
+    return db.query(models.Depot).order_by(models.Depot.code).all()
+
+
+def create_depot(db: Session, depot_in: schemas.DepotCreate) -> models.Depot:
+    depot = models.Depot(**depot_in.model_dump())
+    db.add(depot)
+    db.commit()
+    db.refresh(depot)
+    return depot
+
+
+def get_vehicle_limit(depot: Optional[models.Depot]) -> int:
+    if depot is None or depot.max_vehicles is None:
+        return schemas.MAX_VEHICLES
+    return depot.max_vehicles
+
+
+def count_vehicles(db: Session, depot_id: Optional[int] = None) -> int:
+    query = db.query(func.count(models.Vehicle.id))
+    if depot_id is not None:
+        query = query.filter(models.Vehicle.depot_id == depot_id)
+    return query.scalar()
+
+
+def list_vehicles(
+    db: Session, search: Optional[str] = None, depot_id: Optional[int] = None
+) -> List[models.Vehicle]:
     query = db.query(models.Vehicle)
+    if depot_id is not None:
+        query = query.filter(models.Vehicle.depot_id == depot_id)
     if search:
         pattern = f"%{search.replace('%', '')}%"
         query = query.filter(models.Vehicle.license_plate.ilike(pattern))
     return query.order_by(models.Vehicle.license_plate).all()
 
 
-def get_vehicle(db: Session, vehicle_id: int) -> Optional[models.Vehicle]:
-    return db.query(models.Vehicle).filter(models.Vehicle.id == vehicle_id).first()
+def get_vehicle(
+    db: Session, vehicle_id: int, depot_id: Optional[int] = None
+) -> Optional[models.Vehicle]:
+    query = db.query(models.Vehicle).filter(models.Vehicle.id == vehicle_id)
+    if depot_id is not None:
+        query = query.filter(models.Vehicle.depot_id == depot_id)
+    return query.first()
 
 
 def get_vehicle_by_plate(db: Session, license_plate: str) -> Optional[models.Vehicle]:
@@ -48,10 +213,31 @@ def get_vehicle_by_plate(db: Session, license_plate: str) -> Optional[models.Veh
     )
 
 
-def create_vehicle(db: Session, vehicle_in: schemas.VehicleCreate) -> models.Vehicle:
-    vehicle = models.Vehicle(**vehicle_in.model_dump())
+def create_vehicle(
+    db: Session,
+    vehicle_in: schemas.VehicleCreate,
+    depot_id: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Optional[models.Vehicle]:
+    """Create a vehicle, or return ``None`` if the depot already holds ``limit`` vehicles.
+
+    Also returns ``None`` if the depot no longer exists.
+    """
+    if limit is not None and depot_id is not None:
+        # Serialises concurrent creations per depot on databases with row locks.
+        depot = (
+            db.query(models.Depot).filter(models.Depot.id == depot_id).with_for_update().first()
+        )
+        if depot is None:
+            db.rollback()
+            return None
+    vehicle = models.Vehicle(**vehicle_in.model_dump(), depot_id=depot_id)
     db.add(vehicle)
     db.flush()
+    # Counted after the insert so that, on SQLite, the write lock is already held.
+    if limit is not None and count_vehicles(db, depot_id) > limit:
+        db.rollback()
+        return None
     _ensure_wheel_positions(db, vehicle)
     db.commit()
     db.refresh(vehicle)
@@ -73,6 +259,11 @@ def delete_vehicle(db: Session, vehicle: models.Vehicle) -> None:
 
 
 def _ensure_wheel_positions(db: Session, vehicle: models.Vehicle) -> None:
+    if packed_storage_enabled():
+        if vehicle.wheel_pack is None:
+            # Keep tires recorded before the switch to packed storage.
+            wheel_packing.merge_rows(db, vehicle)
+        return
     existing = {wp.position_index for wp in vehicle.wheel_positions}
     for idx in range(1, schemas.WHEEL_POSITIONS + 1):
         if idx not in existing:
@@ -80,9 +271,45 @@ def _ensure_wheel_positions(db: Session, vehicle: models.Vehicle) -> None:
             db.add(wp)
 
 
+def ensure_wheel_positions(db: Session, vehicle: models.Vehicle) -> None:
+    """Create and commit any missing positions of ``vehicle``."""
+    _ensure_wheel_positions(db, vehicle)
+    if not db.new:
+        return
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        # Tolerate only a concurrent request having created the same positions
+        # (or pack) first; anything else, e.g. a clashing serial, is real.
+        positions_taken = is_unique_violation(
+            exc,
+            models.VEHICLE_POSITION_KEY,
+            "wheel_positions.vehicle_id, wheel_positions.position_index",
+        ) or is_unique_violation(
+            exc, "vehicle_wheel_packs_pkey", "vehicle_wheel_packs.vehicle_id"
+        )
+        if not positions_taken:
+            raise
+        db.rollback()
+
+
+def get_wheel_positions(db: Session, vehicle: models.Vehicle) -> List[AnyWheelPosition]:
+    ensure_wheel_positions(db, vehicle)
+    if packed_storage_enabled():
+        return wheel_packing.unpack(vehicle.wheel_pack)
+    return sorted(vehicle.wheel_positions, key=lambda wp: wp.position_index)
+
+
 def get_wheel_position(
     db: Session, vehicle_id: int, position_index: int
-) -> Optional[models.WheelPosition]:
+) -> Optional[AnyWheelPosition]:
+    if packed_storage_enabled():
+        if not 1 <= position_index <= schemas.WHEEL_POSITIONS:
+            return None
+        wheel_pack = db.get(models.VehicleWheelPack, vehicle_id)
+        if wheel_pack is None:
+            return None
+        return wheel_packing.unpack(wheel_pack)[position_index - 1]
     return (
         db.query(models.WheelPosition)
         .filter(
@@ -93,17 +320,98 @@ def get_wheel_position(
     )
 
 
-def update_wheel_position(
-    db: Session, wheel_position: models.WheelPosition, update_data: schemas.WheelPositionUpdate
-) -> models.WheelPosition:
+def _normalize_serial(tire_serial: Optional[str]) -> Optional[str]:
+    # Empty strings would collide in the unique tire serial index; store them as NULL.
+    return tire_serial or None
+
+
+def find_tire_serial_conflicts(
+    db: Session, vehicle_id: int, positions: List[schemas.WheelPositionBase]
+) -> List[schemas.TireSerialConflict]:
+    """Return serials in ``positions`` that are already installed elsewhere in the fleet.
+
+    Positions that the payload itself overwrites are ignored, so moving a tire between
+    positions of the same vehicle in one request is not reported. Serials repeated
+    within the payload are reported against their later position.
+    """
+    targets = {item.position_index for item in positions}
+    conflicts: List[schemas.TireSerialConflict] = []
+    seen = set()
+    for item in positions:
+        serial = _normalize_serial(item.tire_serial)
+        if not serial:
+            continue
+        if serial in seen:
+            conflicts.append(
+                schemas.TireSerialConflict(
+                    tire_serial=serial, vehicle_id=vehicle_id, position_index=item.position_index
+                )
+            )
+        seen.add(serial)
+    if not seen:
+        return conflicts
+
+    if packed_storage_enabled():
+        rows = _find_packed_serials(db, seen)
+    else:
+        rows = (
+            db.query(
+                models.WheelPosition.tire_serial,
+                models.WheelPosition.vehicle_id,
+                models.WheelPosition.position_index,
+            )
+            .filter(models.WheelPosition.tire_serial.in_(seen))
+            .all()
+        )
+    for tire_serial, row_vehicle_id, position_index in rows:
+        if row_vehicle_id == vehicle_id and position_index in targets:
+            continue
+        conflicts.append(
+            schemas.TireSerialConflict(
+                tire_serial=tire_serial, vehicle_id=row_vehicle_id, position_index=position_index
+            )
+        )
+    return conflicts
+
+
+def _find_packed_serials(db: Session, serials: set) -> List[tuple]:
+    # Vehicles not yet folded into a pack still hold their tires in rows.
+    packed = db.query(
+        models.PackedTireSerial.tire_serial,
+        models.PackedTireSerial.vehicle_id,
+        models.PackedTireSerial.position_index,
+    ).filter(models.PackedTireSerial.tire_serial.in_(serials))
+    unpacked = db.query(
+        models.WheelPosition.tire_serial,
+        models.WheelPosition.vehicle_id,
+        models.WheelPosition.position_index,
+    ).filter(models.WheelPosition.tire_serial.in_(serials))
+    return packed.union_all(unpacked).all()
+
+
+def _apply_serial(wheel_position: AnyWheelPosition, tire_serial: Optional[str]) -> None:
     previous_serial = wheel_position.tire_serial
-    new_serial = update_data.tire_serial
+    new_serial = _normalize_serial(tire_serial)
     wheel_position.tire_serial = new_serial
     if new_serial:
         if previous_serial != new_serial:
             wheel_position.installed_at = datetime.now(timezone.utc)
     else:
         wheel_position.installed_at = None
+
+
+def update_wheel_position(
+    db: Session, wheel_position: AnyWheelPosition, update_data: schemas.WheelPositionUpdate
+) -> AnyWheelPosition:
+    if isinstance(wheel_position, PackedWheelPosition):
+        wheel_pack = db.get(models.VehicleWheelPack, wheel_position.vehicle_id)
+        positions = wheel_packing.unpack(wheel_pack)
+        wheel_position = positions[wheel_position.position_index - 1]
+        _apply_serial(wheel_position, update_data.tire_serial)
+        wheel_packing.store(db, wheel_pack, positions)
+        db.commit()
+        return wheel_position
+    _apply_serial(wheel_position, update_data.tire_serial)
     db.add(wheel_position)
     db.commit()
     db.refresh(wheel_position)
@@ -113,8 +421,17 @@ def update_wheel_position(
 def bulk_update_positions(
     db: Session, vehicle: models.Vehicle, updates: schemas.WheelPositionBulkUpdate
 ) -> models.Vehicle:
-    _ensure_wheel_positions(db, vehicle)
+    ensure_wheel_positions(db, vehicle)
+    if packed_storage_enabled():
+        positions = wheel_packing.unpack(vehicle.wheel_pack)
+        for item in updates.positions:
+            _apply_serial(positions[item.position_index - 1], item.tire_serial)
+        wheel_packing.store(db, vehicle.wheel_pack, positions)
+        db.commit()
+        db.refresh(vehicle)
+        return vehicle
     indexed = {wp.position_index: wp for wp in vehicle.wheel_positions}
+    previous_serials = {}
     for item in updates.positions:
         wp = indexed.get(item.position_index)
         if not wp:
@@ -123,14 +440,75 @@ def bulk_update_positions(
             )
             db.add(wp)
             indexed[item.position_index] = wp
-        previous_serial = wp.tire_serial
-        wp.tire_serial = item.tire_serial
-        if item.tire_serial:
-            if previous_serial != item.tire_serial:
-                wp.installed_at = datetime.now(timezone.utc)
-        else:
-            wp.installed_at = None
+        previous_serials.setdefault(item.position_index, wp.tire_serial)
+        # Clear first so swapping tires between positions does not trip the
+        # unique serial index halfway through the flush.
+        wp.tire_serial = None
+    db.flush()
+    for item in updates.positions:
+        wp = indexed[item.position_index]
+        # Restore the pre-clear serial so _apply_serial can tell whether it changed.
+        wp.tire_serial = previous_serials[item.position_index]
+        _apply_serial(wp, item.tire_serial)
         db.add(wp)
     db.commit()
     db.refresh(vehicle)
     return vehicle
+
+
+def compute_fleet_summary(
+    db: Session, depot_id: Optional[int] = None
+) -> models.FleetSummarySnapshot:
+    vehicle_count = count_vehicles(db, depot_id)
+    query = db.query(func.count(models.WheelPosition.id)).filter(
+        models.WheelPosition.tire_serial.isnot(None)
+    )
+    if depot_id is not None:
+        query = query.join(models.Vehicle).filter(models.Vehicle.depot_id == depot_id)
+    installed = query.scalar()
+    if packed_storage_enabled():
+        # Rows left over from vehicles not yet packed are counted above.
+        query = db.query(func.count(models.PackedTireSerial.tire_serial))
+        if depot_id is not None:
+            query = query.join(
+                models.Vehicle, models.Vehicle.id == models.PackedTireSerial.vehicle_id
+            ).filter(models.Vehicle.depot_id == depot_id)
+        installed += query.scalar()
+    return models.FleetSummarySnapshot(
+        depot_id=depot_id,
+        computed_at=datetime.now(timezone.utc),
+        vehicle_count=vehicle_count,
+        wheel_position_count=vehicle_count * schemas.WHEEL_POSITIONS,
+        installed_tire_count=installed,
+    )
+
+
+def record_fleet_summary(
+    db: Session, depot_id: Optional[int] = None
+) -> models.FleetSummarySnapshot:
+    snapshot = compute_fleet_summary(db, depot_id)
+    db.add(snapshot)
+    db.commit()
+    db.refresh(snapshot)
+    return snapshot
+
+
+def get_latest_fleet_summary(
+    db: Session, depot_id: Optional[int] = None
+) -> Optional[models.FleetSummarySnapshot]:
+    return (
+        db.query(models.FleetSummarySnapshot)
+        .filter(models.FleetSummarySnapshot.depot_id == depot_id)
+        .order_by(models.FleetSummarySnapshot.computed_at.desc())
+        .first()
+    )
+
+
+def prune_fleet_summaries(db: Session, older_than: datetime) -> int:
+    deleted = (
+        db.query(models.FleetSummarySnapshot)
+        .filter(models.FleetSummarySnapshot.computed_at < older_than)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
@@ -2,16 +2,41 @@ import os
 from contextlib import contextmanager
 from typing import Iterator
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tire_management.db")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Size the WAL file is cut back to after a checkpoint; the scheduler only runs
+# non-blocking checkpoints, which never truncate it themselves.
+SQLITE_JOURNAL_SIZE_LIMIT = int(os.getenv("SQLITE_JOURNAL_SIZE_LIMIT", str(64 * 1024 * 1024)))
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
-    pool_pre_ping=True,
-)
+
+def create_db_engine(url: str) -> Engine:
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_pre_ping=True)
+
+    db_engine = create_engine(url, connect_args={"check_same_thread": False}, pool_pre_ping=True)
+
+    @event.listens_for(db_engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record) -> None:
+        # WAL lets readers proceed while a writer commits, and the busy timeout
+        # makes concurrent writers queue instead of failing with "database is locked".
+        # auto_vacuum has to come first: it only takes effect on a database with
+        # no tables yet, and switching to WAL already writes the file header.
+        # Existing files are converted by migrations._ensure_incremental_auto_vacuum.
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA journal_size_limit={SQLITE_JOURNAL_SIZE_LIMIT}")
+        cursor.close()
+
+    return db_engine
+
+
+engine = create_db_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
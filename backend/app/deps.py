@@ -6,7 +6,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
-from . import crud, schemas
+from . import crud, schemas, security
 from .database import get_db as _get_db
 from .security import decode_token
 
@@ -28,7 +28,25 @@ def get_current_user(
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if payload.uid is not None:
+        # crud.deactivate_user revokes outstanding tokens, so the claims can be
+        # trusted. They are not refreshed, though: after changing a user's depot
+        # or superuser flag, call crud.revoke_user_tokens to retire the old ones.
+        return schemas.UserRead(
+            id=payload.uid,
+            username=payload.sub,
+            depot_id=payload.depot,
+            is_superuser=payload.su,
+        )
+    # Tokens issued before identity claims existed still need the user row.
     user = crud.get_user_by_username(db, payload.sub)
     if not user or not user.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Inactive user")
+    # decode_token could not apply per-user cut-offs without a uid claim.
+    if security.revocations.is_revoked(None, user.id, payload.iat):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return schemas.UserRead.model_validate(user)
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import argparse
 import os
+import time
+from typing import Dict
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from . import crud, database, migrations, models, schemas
@@ -11,16 +15,70 @@ DEFAULT_USERNAME = os.getenv("DEFAULT_ADMIN_USERNAME", "admin")
 DEFAULT_PASSWORD = os.getenv("DEFAULT_ADMIN_PASSWORD", "admin123")
 
 
-def init_db() -> None:
-    migrations.apply_migrations(database.engine)
-    models.Base.metadata.create_all(bind=database.engine)
+def init_db(check_only: bool = False) -> Dict[str, float]:
+    """Bring the schema up to date and create the default admin.
+
+    With ``check_only`` the migrations and ``create_all`` are skipped when the
+    recorded schema version already matches ``migrations.SCHEMA_VERSION``.
+    Returns the time spent in each step, in milliseconds.
+    """
+    timings: Dict[str, float] = {}
+
+    started = time.perf_counter()
+    if not check_only or migrations.get_schema_version(database.engine) != migrations.SCHEMA_VERSION:
+        migrations.apply_migrations(database.engine)
+        models.Base.metadata.create_all(bind=database.engine)
+        migrations.record_schema_version(database.engine)
+    timings["schema"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with database.get_db() as db:
+        # Only a brand-new database gets the default admin. Re-creating it
+        # whenever it is missing would bring back admin/admin123 after an
+        # operator deleted it; superusers after that are granted explicitly
+        # with --grant-superuser.
+        if crud.count_users(db) == 0:
+            try:
+                crud.create_user(
+                    db,
+                    schemas.UserCreate(username=DEFAULT_USERNAME, password=DEFAULT_PASSWORD),
+                    is_superuser=True,
+                )
+            except IntegrityError:
+                # Another worker starting at the same time created it first.
+                db.rollback()
+    timings["default_admin"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def grant_superuser(username: str) -> bool:
+    """Make ``username`` a superuser; returns False if there is no such user.
+
+    The flag is carried in access tokens, so it applies from the user's next login.
+    """
     with database.get_db() as db:
-        if not crud.get_user_by_username(db, DEFAULT_USERNAME):
-            crud.create_user(
-                db,
-                schemas.UserCreate(username=DEFAULT_USERNAME, password=DEFAULT_PASSWORD),
-            )
+        user = crud.get_user_by_username(db, username)
+        if user is None:
+            return False
+        user.is_superuser = True
+        db.commit()
+    return True
 
 
 if __name__ == "__main__":
-    init_db()
+    parser = argparse.ArgumentParser(description="Initialise the tire management database.")
+    parser.add_argument(
+        "--check-only",
+        action="store_true",
+        help="skip migrations when the schema version already matches",
+    )
+    parser.add_argument(
+        "--grant-superuser",
+        metavar="USERNAME",
+        help="make an existing user a superuser",
+    )
+    args = parser.parse_args()
+    for step, elapsed in init_db(check_only=args.check_only).items():
+        print(f"{step}: {elapsed:.1f} ms")
+    if args.grant_superuser and not grant_superuser(args.grant_superuser):
+        parser.exit(1, f"User {args.grant_superuser} not found\n")
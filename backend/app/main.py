@@ -1,65 +1,172 @@
 from __future__ import annotations
 
-from typing import List, Optional
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional
 
-from fastapi import Depends, FastAPI, HTTPException, Response, status
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
-from . import crud, migrations, models, schemas, security
-from .database import engine
-from .deps import get_current_user, get_db
+from . import crud, init_db, models, scheduler, schemas, security
+from .deps import get_current_user, get_db, oauth2_scheme
 
-migrations.apply_migrations(engine)
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI(
-    title="Tire Management System",
-    description=(
-        "API for managing heavy-duty truck tires, providing vehicle management, "
-        "wheel position assignments, and authentication."
-    ),
-)
+# Set to "1" on workers that only need to verify the schema version at startup.
+SCHEMA_CHECK_ONLY = os.getenv("SCHEMA_CHECK_ONLY", "0") == "1"
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+router = APIRouter()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    started = time.perf_counter()
+    timings = init_db.init_db(check_only=SCHEMA_CHECK_ONLY)
+    scheduler.sync_revocations()
+    timings["total"] = (time.perf_counter() - started) * 1000
+    app.state.startup_timings = timings
+    logger.info(
+        "Startup completed in %.1f ms (%s)",
+        timings["total"],
+        ", ".join(f"{step}={elapsed:.1f} ms" for step, elapsed in timings.items() if step != "total"),
+    )
+    app.state.scheduler = scheduler.build_default_scheduler(
+        maintenance=scheduler.SCHEDULER_ENABLED
+    )
+    if app.state.scheduler.jobs:
+        app.state.scheduler.start()
+    else:
+        app.state.scheduler = None
+    try:
+        yield
+    finally:
+        if getattr(app.state, "scheduler", None) is not None:
+            app.state.scheduler.shutdown()
+
+
+def integrity_error_handler(request: Request, exc: IntegrityError) -> JSONResponse:
+    # Only unique keys a client can collide with are conflicts; any other
+    # violation (NOT NULL, foreign key, ...) is a server bug and stays a 500.
+    serial_taken = crud.is_unique_violation(
+        exc, models.TIRE_SERIAL_INDEX, "wheel_positions.tire_serial"
+    ) or crud.is_unique_violation(
+        exc, models.PACKED_TIRE_SERIAL_KEY, "packed_tire_serials.tire_serial"
+    )
+    if serial_taken:
+        detail = "Tire serial is already installed at another position"
+    elif crud.is_unique_violation(exc, "ix_vehicles_license_plate", "vehicles.license_plate"):
+        detail = "Vehicle already exists"
+    else:
+        raise exc
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": detail})
 
 
-@app.post("/auth/login", response_model=schemas.Token, tags=["Authentication"])
+def stale_data_handler(request: Request, exc: StaleDataError) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "Wheel positions were changed concurrently, please retry"},
+    )
+
+
+def _vehicle_with_positions(db: Session, vehicle: models.Vehicle) -> schemas.VehicleWithPositions:
+    return schemas.VehicleWithPositions(
+        id=vehicle.id,
+        license_plate=vehicle.license_plate,
+        description=vehicle.description,
+        wheel_positions=[
+            schemas.WheelPositionRead.model_validate(wp)
+            for wp in crud.get_wheel_positions(db, vehicle)
+        ],
+    )
+
+
+@router.post("/auth/login", response_model=schemas.Token, tags=["Authentication"])
 def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
 ) -> schemas.Token:
     user = crud.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    access_token = security.create_access_token(subject=user.username)
-    return schemas.Token(access_token=access_token)
+    return schemas.Token(access_token=crud.create_user_token(user))
+
+
+@router.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT, tags=["Authentication"])
+def logout(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(get_current_user),
+) -> Response:
+    payload = security.decode_token(token)
+    if payload and payload.jti and payload.exp:
+        crud.revoke_token(db, payload.jti, datetime.fromtimestamp(payload.exp, timezone.utc))
+    else:
+        # Legacy tokens have no jti to revoke on its own, so the only way to
+        # end the session is a per-user cut-off, which logs out every session.
+        crud.revoke_user_tokens(db, crud.get_user_by_username(db, current_user.username))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post("/auth/revoke", status_code=status.HTTP_204_NO_CONTENT, tags=["Authentication"])
+def revoke_user_tokens(
+    revoke_in: schemas.TokenRevoke,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(get_current_user),
+) -> Response:
+    if revoke_in.jti and revoke_in.username:
+        raise HTTPException(status_code=400, detail="Give either jti or username, not both")
+    if revoke_in.jti:
+        # Token ids are not stored, so ownership of another token cannot be
+        # checked; only superusers may revoke tokens other than their own.
+        payload = security.decode_token(token)
+        if payload and payload.jti == revoke_in.jti and payload.exp:
+            expires_at = datetime.fromtimestamp(payload.exp, timezone.utc)
+        elif current_user.is_superuser:
+            # Nothing issued from now on outlives the default token lifetime.
+            expires_at = datetime.now(timezone.utc) + timedelta(
+                minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES
+            )
+        else:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not permitted")
+        crud.revoke_token(db, revoke_in.jti, expires_at)
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    username = revoke_in.username or current_user.username
+    if username != current_user.username and not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not permitted")
+    user = crud.get_user_by_username(db, username)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    crud.revoke_user_tokens(db, user)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
-@app.get("/auth/me", response_model=schemas.UserRead, tags=["Authentication"])
+@router.get("/auth/me", response_model=schemas.UserRead, tags=["Authentication"])
 def read_users_me(current_user: schemas.UserRead = Depends(get_current_user)) -> schemas.UserRead:
     return current_user
 
 
-@app.get("/vehicles", response_model=List[schemas.VehicleRead], tags=["Vehicles"])
+@router.get("/vehicles", response_model=List[schemas.VehicleRead], tags=["Vehicles"])
 def read_vehicles(
     search: Optional[str] = None,
     db: Session = Depends(get_db),
-    _: schemas.UserRead = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ) -> List[schemas.VehicleRead]:
     return [
         schemas.VehicleRead.model_validate(vehicle)
-        for vehicle in crud.list_vehicles(db, search=search)
+        for vehicle in crud.list_vehicles(db, search=search, depot_id=current_user.depot_id)
     ]
 
 
-@app.post(
+@router.post(
     "/vehicles",
     response_model=schemas.VehicleWithPositions,
     status_code=status.HTTP_201_CREATED,
@@ -68,43 +175,46 @@ def read_vehicles(
 def create_vehicle(
     vehicle_in: schemas.VehicleCreate,
     db: Session = Depends(get_db),
-    _: schemas.UserRead = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ) -> schemas.VehicleWithPositions:
-    if len(crud.list_vehicles(db)) >= schemas.MAX_VEHICLES:
-        raise HTTPException(status_code=400, detail="Vehicle limit reached")
+    depot = crud.get_depot(db, current_user.depot_id) if current_user.depot_id else None
+    if current_user.depot_id and not depot:
+        raise HTTPException(status_code=404, detail="Depot not found")
     existing = crud.get_vehicle_by_plate(db, vehicle_in.license_plate)
     if existing:
         raise HTTPException(status_code=400, detail="Vehicle already exists")
-    vehicle = crud.create_vehicle(db, vehicle_in)
-    return schemas.VehicleWithPositions.model_validate(vehicle)
+    vehicle = crud.create_vehicle(
+        db, vehicle_in, depot_id=current_user.depot_id, limit=crud.get_vehicle_limit(depot)
+    )
+    if not vehicle:
+        raise HTTPException(status_code=400, detail="Vehicle limit reached")
+    return _vehicle_with_positions(db, vehicle)
 
 
-@app.get(
+@router.get(
     "/vehicles/{vehicle_id}", response_model=schemas.VehicleWithPositions, tags=["Vehicles"]
 )
 def read_vehicle(
     vehicle_id: int,
     db: Session = Depends(get_db),
-    _: schemas.UserRead = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ) -> schemas.VehicleWithPositions:
-    vehicle = crud.get_vehicle(db, vehicle_id)
+    vehicle = crud.get_vehicle(db, vehicle_id, depot_id=current_user.depot_id)
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
-    crud._ensure_wheel_positions(db, vehicle)  # ensure positions exist
-    db.refresh(vehicle)
-    return schemas.VehicleWithPositions.model_validate(vehicle)
+    return _vehicle_with_positions(db, vehicle)
 
 
-@app.put(
+@router.put(
     "/vehicles/{vehicle_id}", response_model=schemas.VehicleWithPositions, tags=["Vehicles"]
 )
 def update_vehicle(
     vehicle_id: int,
     vehicle_in: schemas.VehicleUpdate,
     db: Session = Depends(get_db),
-    _: schemas.UserRead = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ) -> schemas.VehicleWithPositions:
-    vehicle = crud.get_vehicle(db, vehicle_id)
+    vehicle = crud.get_vehicle(db, vehicle_id, depot_id=current_user.depot_id)
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     update_data = vehicle_in.model_dump(exclude_unset=True)
@@ -116,10 +226,10 @@ def update_vehicle(
             raise HTTPException(status_code=400, detail="Vehicle already exists")
         update_data["license_plate"] = normalized_plate
     vehicle = crud.update_vehicle(db, vehicle, schemas.VehicleUpdate(**update_data))
-    return schemas.VehicleWithPositions.model_validate(vehicle)
+    return _vehicle_with_positions(db, vehicle)
 
 
-@app.delete(
+@router.delete(
     "/vehicles/{vehicle_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     tags=["Vehicles"],
@@ -128,16 +238,16 @@ def update_vehicle(
 def delete_vehicle(
     vehicle_id: int,
     db: Session = Depends(get_db),
-    _: schemas.UserRead = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ) -> Response:
-    vehicle = crud.get_vehicle(db, vehicle_id)
+    vehicle = crud.get_vehicle(db, vehicle_id, depot_id=current_user.depot_id)
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     crud.delete_vehicle(db, vehicle)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
-@app.get(
+@router.get(
     "/vehicles/{vehicle_id}/wheel-positions",
     response_model=List[schemas.WheelPositionRead],
     tags=["Wheel Positions"],
@@ -145,20 +255,18 @@ def delete_vehicle(
 def read_wheel_positions(
     vehicle_id: int,
     db: Session = Depends(get_db),
-    _: schemas.UserRead = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ) -> List[schemas.WheelPositionRead]:
-    vehicle = crud.get_vehicle(db, vehicle_id)
+    vehicle = crud.get_vehicle(db, vehicle_id, depot_id=current_user.depot_id)
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
-    crud._ensure_wheel_positions(db, vehicle)
-    db.refresh(vehicle)
     return [
         schemas.WheelPositionRead.model_validate(wp)
-        for wp in vehicle.wheel_positions
+        for wp in crud.get_wheel_positions(db, vehicle)
     ]
 
 
-@app.put(
+@router.put(
     "/vehicles/{vehicle_id}/wheel-positions/{position_index}",
     response_model=schemas.WheelPositionRead,
     tags=["Wheel Positions"],
@@ -168,23 +276,32 @@ def install_or_update_tire(
     position_index: int,
     update: schemas.WheelPositionUpdate,
     db: Session = Depends(get_db),
-    _: schemas.UserRead = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ) -> schemas.WheelPositionRead:
     if position_index < 1 or position_index > schemas.WHEEL_POSITIONS:
         raise HTTPException(status_code=400, detail="Invalid wheel position index")
+    vehicle = crud.get_vehicle(db, vehicle_id, depot_id=current_user.depot_id)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
     wheel_position = crud.get_wheel_position(db, vehicle_id, position_index)
     if not wheel_position:
-        vehicle = crud.get_vehicle(db, vehicle_id)
-        if not vehicle:
-            raise HTTPException(status_code=404, detail="Vehicle not found")
-        crud._ensure_wheel_positions(db, vehicle)
-        db.commit()
+        crud.ensure_wheel_positions(db, vehicle)
         wheel_position = crud.get_wheel_position(db, vehicle_id, position_index)
+    conflicts = crud.find_tire_serial_conflicts(
+        db,
+        vehicle_id,
+        [schemas.WheelPositionBase(position_index=position_index, tire_serial=update.tire_serial)],
+    )
+    if conflicts:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=[conflict.model_dump() for conflict in conflicts],
+        )
     wheel_position = crud.update_wheel_position(db, wheel_position, update)
     return schemas.WheelPositionRead.model_validate(wheel_position)
 
 
-@app.delete(
+@router.delete(
     "/vehicles/{vehicle_id}/wheel-positions/{position_index}",
     response_model=schemas.WheelPositionRead,
     tags=["Wheel Positions"],
@@ -193,8 +310,10 @@ def remove_tire(
     vehicle_id: int,
     position_index: int,
     db: Session = Depends(get_db),
-    _: schemas.UserRead = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ) -> schemas.WheelPositionRead:
+    if not crud.get_vehicle(db, vehicle_id, depot_id=current_user.depot_id):
+        raise HTTPException(status_code=404, detail="Vehicle not found")
     wheel_position = crud.get_wheel_position(db, vehicle_id, position_index)
     if not wheel_position:
         raise HTTPException(status_code=404, detail="Wheel position not found")
@@ -204,7 +323,7 @@ def remove_tire(
     return schemas.WheelPositionRead.model_validate(wheel_position)
 
 
-@app.post(
+@router.post(
     "/vehicles/{vehicle_id}/wheel-positions/bulk",
     response_model=schemas.VehicleWithPositions,
     tags=["Wheel Positions"],
@@ -213,15 +332,106 @@ def bulk_update_wheel_positions(
     vehicle_id: int,
     updates: schemas.WheelPositionBulkUpdate,
     db: Session = Depends(get_db),
-    _: schemas.UserRead = Depends(get_current_user),
+    current_user: schemas.UserRead = Depends(get_current_user),
 ) -> schemas.VehicleWithPositions:
-    vehicle = crud.get_vehicle(db, vehicle_id)
+    vehicle = crud.get_vehicle(db, vehicle_id, depot_id=current_user.depot_id)
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
+    conflicts = crud.find_tire_serial_conflicts(db, vehicle_id, updates.positions)
+    if conflicts:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=[conflict.model_dump() for conflict in conflicts],
+        )
     vehicle = crud.bulk_update_positions(db, vehicle, updates)
-    return schemas.VehicleWithPositions.model_validate(vehicle)
+    return _vehicle_with_positions(db, vehicle)
+
+
+@router.post(
+    "/vehicles/{vehicle_id}/wheel-positions/bulk/conflicts",
+    response_model=schemas.TireSerialConflictReport,
+    tags=["Wheel Positions"],
+)
+def check_bulk_conflicts(
+    vehicle_id: int,
+    updates: schemas.WheelPositionBulkUpdate,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(get_current_user),
+) -> schemas.TireSerialConflictReport:
+    vehicle = crud.get_vehicle(db, vehicle_id, depot_id=current_user.depot_id)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    return schemas.TireSerialConflictReport(
+        conflicts=crud.find_tire_serial_conflicts(db, vehicle_id, updates.positions)
+    )
 
 
-@app.get("/health", tags=["Health"])
+@router.get("/fleet/summary", response_model=schemas.FleetSummary, tags=["Fleet"])
+def read_fleet_summary(
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(get_current_user),
+) -> schemas.FleetSummary:
+    depot_id = current_user.depot_id
+    summary = crud.get_latest_fleet_summary(db, depot_id) or crud.compute_fleet_summary(
+        db, depot_id
+    )
+    return schemas.FleetSummary.model_validate(summary)
+
+
+@router.get("/depots/current", response_model=schemas.DepotRead, tags=["Depots"])
+def read_current_depot(
+    db: Session = Depends(get_db),
+    current_user: schemas.UserRead = Depends(get_current_user),
+) -> schemas.DepotRead:
+    depot = crud.get_depot(db, current_user.depot_id) if current_user.depot_id else None
+    if not depot:
+        raise HTTPException(status_code=404, detail="Depot not found")
+    return schemas.DepotRead(
+        id=depot.id,
+        code=depot.code,
+        name=depot.name,
+        max_vehicles=depot.max_vehicles,
+        vehicle_count=crud.count_vehicles(db, depot.id),
+        vehicle_limit=crud.get_vehicle_limit(depot),
+    )
+
+
+@router.get("/scheduler/jobs", response_model=schemas.SchedulerStatus, tags=["Maintenance"])
+def read_scheduler_jobs(
+    request: Request,
+    _: schemas.UserRead = Depends(get_current_user),
+) -> schemas.SchedulerStatus:
+    job_scheduler = getattr(request.app.state, "scheduler", None)
+    if job_scheduler is None:
+        return schemas.SchedulerStatus(leader=False, jobs=[])
+    return schemas.SchedulerStatus(leader=job_scheduler.leader, jobs=job_scheduler.metrics())
+
+
+@router.get("/health", tags=["Health"])
 def health_check() -> dict:
     return {"status": "ok"}
+
+
+def create_app() -> FastAPI:
+    application = FastAPI(
+        title="Tire Management System",
+        description=(
+            "API for managing heavy-duty truck tires, providing vehicle management, "
+            "wheel position assignments, and authentication."
+        ),
+        lifespan=lifespan,
+    )
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    application.add_exception_handler(IntegrityError, integrity_error_handler)
+    application.add_exception_handler(StaleDataError, stale_data_handler)
+    application.include_router(router)
+    return application
+
+
+app = create_app()
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import logging
+from typing import Optional
+
 from sqlalchemy import inspect, text
 from sqlalchemy.engine import Engine
 
-from . import schemas
+from . import models, schemas, wheel_packing
+
+logger = logging.getLogger(__name__)
 
 
 def _ensure_wheel_installed_at_column(engine: Engine) -> None:
@@ -29,10 +34,35 @@ def _ensure_wheel_installed_at_column(engine: Engine) -> None:
         )
 
 
+# Bump whenever the models or the migrations below change, so that
+# ``init_db(check_only=True)`` knows an existing database needs work.
+SCHEMA_VERSION = 8
+
+
+def get_schema_version(engine: Engine) -> Optional[int]:
+    with engine.connect() as connection:
+        if not inspect(connection).has_table("schema_version"):
+            return None
+        return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+
+
+def record_schema_version(engine: Engine) -> None:
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM schema_version"))
+        connection.execute(
+            text("INSERT INTO schema_version (version) VALUES (:version)"),
+            {"version": SCHEMA_VERSION},
+        )
+
+
 def apply_migrations(engine: Engine) -> None:
     """Run lightweight schema migrations for deployments without Alembic."""
     _ensure_wheel_installed_at_column(engine)
     _ensure_full_wheel_positions(engine)
+    _ensure_unique_tire_serial_index(engine)
+    _ensure_depots(engine)
+    _ensure_packed_tire_serials(engine)
+    _ensure_incremental_auto_vacuum(engine)
 
 
 def _ensure_full_wheel_positions(engine: Engine) -> None:
@@ -43,7 +73,11 @@ def _ensure_full_wheel_positions(engine: Engine) -> None:
         ):
             return
 
-        vehicle_ids = [row[0] for row in connection.execute(text("SELECT id FROM vehicles"))]
+        query = "SELECT id FROM vehicles"
+        if "vehicle_wheel_packs" in inspector.get_table_names():
+            # Packed vehicles keep their positions in a single row instead.
+            query += " WHERE id NOT IN (SELECT vehicle_id FROM vehicle_wheel_packs)"
+        vehicle_ids = [row[0] for row in connection.execute(text(query))]
         if not vehicle_ids:
             return
 
@@ -74,3 +108,141 @@ def _ensure_full_wheel_positions(engine: Engine) -> None:
                         "position_index": position_index,
                     },
                 )
+
+
+def _ensure_unique_tire_serial_index(engine: Engine) -> None:
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        if "wheel_positions" not in inspector.get_table_names():
+            return
+
+        indexes = {index["name"] for index in inspector.get_indexes("wheel_positions")}
+        if models.TIRE_SERIAL_INDEX in indexes:
+            return
+
+        duplicates = connection.execute(
+            text(
+                "SELECT tire_serial, COUNT(*) FROM wheel_positions "
+                "WHERE tire_serial IS NOT NULL "
+                "GROUP BY tire_serial HAVING COUNT(*) > 1"
+            )
+        ).all()
+        if duplicates:
+            logger.warning(
+                "Skipping %s: %d tire serial(s) are installed at more than one position (%s)",
+                models.TIRE_SERIAL_INDEX,
+                len(duplicates),
+                ", ".join(row[0] for row in duplicates[:10]),
+            )
+            return
+
+        # MySQL has no partial indexes, but its unique indexes already ignore NULLs.
+        where_clause = (
+            "" if connection.dialect.name in {"mysql", "mariadb"} else " WHERE tire_serial IS NOT NULL"
+        )
+        connection.execute(
+            text(
+                f"CREATE UNIQUE INDEX {models.TIRE_SERIAL_INDEX} "
+                f"ON wheel_positions (tire_serial){where_clause}"
+            )
+        )
+
+
+def _ensure_depots(engine: Engine) -> None:
+    """Add ``depot_id`` to pre-depot tables and assign existing rows to the default depot."""
+    depot_tables = {
+        "vehicles": models.Vehicle.__table__,
+        "users": models.User.__table__,
+        "fleet_summary_snapshots": models.FleetSummarySnapshot.__table__,
+    }
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing = [name for name in depot_tables if inspector.has_table(name)]
+        if not existing:
+            return
+
+        models.Depot.__table__.create(connection, checkfirst=True)
+        for name in existing:
+            columns = {column["name"] for column in inspector.get_columns(name)}
+            if "depot_id" not in columns:
+                connection.execute(text(f"ALTER TABLE {name} ADD COLUMN depot_id INTEGER"))
+            for index in depot_tables[name].indexes:
+                if "depot_id" in index.columns:
+                    index.create(connection, checkfirst=True)
+
+        if not {"vehicles", "users"}.intersection(existing):
+            return
+        depot_id = connection.execute(
+            text("SELECT id FROM depots WHERE code = :code"), {"code": schemas.DEFAULT_DEPOT_CODE}
+        ).scalar()
+        if depot_id is None:
+            connection.execute(
+                text("INSERT INTO depots (code, name) VALUES (:code, :code)"),
+                {"code": schemas.DEFAULT_DEPOT_CODE},
+            )
+            depot_id = connection.execute(
+                text("SELECT id FROM depots WHERE code = :code"),
+                {"code": schemas.DEFAULT_DEPOT_CODE},
+            ).scalar()
+        for name in {"vehicles", "users"}.intersection(existing):
+            connection.execute(
+                text(f"UPDATE {name} SET depot_id = :depot_id WHERE depot_id IS NULL"),
+                {"depot_id": depot_id},
+            )
+
+
+def _ensure_packed_tire_serials(engine: Engine) -> None:
+    """Index the serials of packs written before ``packed_tire_serials`` existed."""
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        if not inspector.has_table("vehicle_wheel_packs") or inspector.has_table(
+            "packed_tire_serials"
+        ):
+            return
+
+        models.PackedTireSerial.__table__.create(connection)
+        installed = {}
+        duplicates = set()
+        for vehicle_id, payload in connection.execute(
+            text("SELECT vehicle_id, positions FROM vehicle_wheel_packs")
+        ):
+            wheel_pack = models.VehicleWheelPack(vehicle_id=vehicle_id, positions=payload)
+            for position in wheel_packing.unpack(wheel_pack):
+                if not position.tire_serial:
+                    continue
+                if position.tire_serial in installed:
+                    duplicates.add(position.tire_serial)
+                    continue
+                installed[position.tire_serial] = (vehicle_id, position.position_index)
+        if duplicates:
+            logger.warning(
+                "%d tire serial(s) are packed at more than one position; indexing the first (%s)",
+                len(duplicates),
+                ", ".join(sorted(duplicates)[:10]),
+            )
+        if installed:
+            connection.execute(
+                models.PackedTireSerial.__table__.insert(),
+                [
+                    {"tire_serial": serial, "vehicle_id": vehicle_id, "position_index": index}
+                    for serial, (vehicle_id, index) in installed.items()
+                ],
+            )
+
+
+def _ensure_incremental_auto_vacuum(engine: Engine) -> None:
+    """Switch SQLite files created before ``auto_vacuum=INCREMENTAL`` over to it.
+
+    Only a full VACUUM can change the setting once tables exist. It rewrites
+    the whole file under an exclusive lock, so it runs once here at deploy time
+    rather than from the scheduler.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        # 2 is INCREMENTAL.
+        if connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+            return
+        logger.info("Rebuilding the SQLite database with auto_vacuum=INCREMENTAL")
+        connection.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+        connection.execute(text("VACUUM"))
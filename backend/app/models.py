@@ -2,18 +2,46 @@ from __future__ import annotations
 
 from typing import List
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    PrimaryKeyConstraint,
+    String,
+    Text,
+    UniqueConstraint,
+    text,
+)
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
 
+TIRE_SERIAL_INDEX = "uq_wheel_positions_tire_serial"
+VEHICLE_POSITION_KEY = "uq_vehicle_position"
+PACKED_TIRE_SERIAL_KEY = "pk_packed_tire_serials"
+
+
+class Depot(Base):
+    __tablename__ = "depots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(32), unique=True, index=True, nullable=False)
+    name = Column(String(255), nullable=True)
+    # Falls back to schemas.MAX_VEHICLES when unset.
+    max_vehicles = Column(Integer, nullable=True)
+
 
 class Vehicle(Base):
     __tablename__ = "vehicles"
+    __table_args__ = (Index("ix_vehicles_depot_plate", "depot_id", "license_plate"),)
 
     id = Column(Integer, primary_key=True, index=True)
     license_plate = Column(String(32), unique=True, index=True, nullable=False)
     description = Column(String(255), nullable=True)
+    depot_id = Column(Integer, ForeignKey("depots.id"), nullable=True)
 
     wheel_positions = relationship(
         "WheelPosition",
@@ -21,11 +49,26 @@ class Vehicle(Base):
         cascade="all, delete-orphan",
         back_populates="vehicle",
     )
+    wheel_pack = relationship(
+        "VehicleWheelPack",
+        uselist=False,
+        cascade="all, delete-orphan",
+        back_populates="vehicle",
+    )
 
 
 class WheelPosition(Base):
     __tablename__ = "wheel_positions"
-    __table_args__ = (UniqueConstraint("vehicle_id", "position_index", name="uq_vehicle_position"),)
+    __table_args__ = (
+        UniqueConstraint("vehicle_id", "position_index", name=VEHICLE_POSITION_KEY),
+        Index(
+            TIRE_SERIAL_INDEX,
+            "tire_serial",
+            unique=True,
+            sqlite_where=text("tire_serial IS NOT NULL"),
+            postgresql_where=text("tire_serial IS NOT NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id", ondelete="CASCADE"), nullable=False)
@@ -36,11 +79,80 @@ class WheelPosition(Base):
     vehicle = relationship("Vehicle", back_populates="wheel_positions")
 
 
+class VehicleWheelPack(Base):
+    """All wheel positions of one vehicle packed into a single row (see ``wheel_packing``)."""
+
+    __tablename__ = "vehicle_wheel_packs"
+
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id", ondelete="CASCADE"), primary_key=True)
+    positions = Column(Text, nullable=False)
+    version = Column(Integer, nullable=False)
+
+    vehicle = relationship("Vehicle", back_populates="wheel_pack")
+    serials = relationship(
+        "PackedTireSerial", cascade="all, delete-orphan", back_populates="wheel_pack"
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
+
+class PackedTireSerial(Base):
+    """Serials installed in a wheel pack, keyed so each is installed only once fleet-wide."""
+
+    __tablename__ = "packed_tire_serials"
+    __table_args__ = (PrimaryKeyConstraint("tire_serial", name=PACKED_TIRE_SERIAL_KEY),)
+
+    tire_serial = Column(String(64), nullable=False)
+    vehicle_id = Column(
+        Integer,
+        ForeignKey("vehicle_wheel_packs.vehicle_id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    position_index = Column(Integer, nullable=False)
+
+    wheel_pack = relationship("VehicleWheelPack", back_populates="serials")
+
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_depot_username", "depot_id", "username"),)
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, index=True, nullable=False)
     hashed_password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True)
     is_superuser = Column(Boolean, default=False)
+    depot_id = Column(Integer, ForeignKey("depots.id"), nullable=True)
+
+
+class FleetSummarySnapshot(Base):
+    __tablename__ = "fleet_summary_snapshots"
+    __table_args__ = (
+        Index("ix_fleet_summary_snapshots_depot_computed", "depot_id", "computed_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    depot_id = Column(Integer, ForeignKey("depots.id", ondelete="CASCADE"), nullable=True)
+    computed_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    vehicle_count = Column(Integer, nullable=False)
+    wheel_position_count = Column(Integer, nullable=False)
+    installed_tire_count = Column(Integer, nullable=False)
+
+
+class TokenRevocation(Base):
+    """A revoked token (``jti``) or a cut-off for all tokens of ``user_id``."""
+
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String(64), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
@@ -0,0 +1,254 @@
+"""In-process scheduler for periodic maintenance jobs.
+
+The scheduler is started from the application lifespan. Jobs run on a small
+thread pool of their own so they never occupy request threads, and a job is
+never started again while its previous run is still going. When several
+workers share a host only the one holding ``SCHEDULER_LOCK_FILE`` runs jobs;
+the others keep retrying the lock and take over if the leader exits. Jobs
+registered with ``leader_only=False`` keep per-worker state fresh and run on
+every worker. ``SCHEDULER_ENABLED=0`` turns off the maintenance jobs only; the
+revocation sync keeps running (``REVOCATION_SYNC_SECONDS=0`` disables it).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from . import crud, database, schemas
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "2"))
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE", "./scheduler.lock")
+FLEET_SUMMARY_INTERVAL_SECONDS = int(os.getenv("FLEET_SUMMARY_INTERVAL_SECONDS", "300"))
+FLEET_SUMMARY_RETENTION_DAYS = int(os.getenv("FLEET_SUMMARY_RETENTION_DAYS", "30"))
+REVOCATION_SYNC_SECONDS = int(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+# Free pages returned to the filesystem per run. Needs auto_vacuum=INCREMENTAL,
+# which database.create_db_engine and the migrations set up.
+INCREMENTAL_VACUUM_PAGES = int(os.getenv("INCREMENTAL_VACUUM_PAGES", "1000"))
+
+TICK_SECONDS = 1.0
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+@dataclass
+class Job:
+    name: str
+    interval_seconds: float
+    func: Callable[[], None]
+    leader_only: bool = True
+    next_run: float = 0.0
+    running: bool = False
+    runs: int = 0
+    failures: int = 0
+    last_started_at: Optional[datetime] = None
+    last_duration_ms: Optional[float] = None
+    last_error: Optional[str] = None
+
+    def metrics(self) -> schemas.JobMetrics:
+        return schemas.JobMetrics(
+            name=self.name,
+            interval_seconds=self.interval_seconds,
+            running=self.running,
+            runs=self.runs,
+            failures=self.failures,
+            last_started_at=self.last_started_at,
+            last_duration_ms=self.last_duration_ms,
+            last_error=self.last_error,
+        )
+
+
+class Scheduler:
+    def __init__(
+        self, workers: int = SCHEDULER_WORKERS, lock_file: Optional[str] = SCHEDULER_LOCK_FILE
+    ) -> None:
+        self.workers = workers
+        self.lock_file = lock_file
+        self.jobs: Dict[str, Job] = {}
+        self._lock_handle = None
+        self._stop = threading.Event()
+        self._mutex = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def leader(self) -> bool:
+        return self.lock_file is None or fcntl is None or self._lock_handle is not None
+
+    def register(
+        self,
+        name: str,
+        interval_seconds: float,
+        func: Callable[[], None],
+        initial_delay: float = 0.0,
+        leader_only: bool = True,
+    ) -> Job:
+        job = Job(
+            name=name, interval_seconds=interval_seconds, func=func, leader_only=leader_only
+        )
+        job.next_run = time.monotonic() + initial_delay
+        self.jobs[name] = job
+        return job
+
+    def start(self) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="scheduler-job"
+        )
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._release_lock()
+
+    def run_pending(self) -> None:
+        """Submit every job that is due; leader-only jobs are skipped on followers."""
+        leader = self._acquire_lock()
+        now = time.monotonic()
+        with self._mutex:
+            for job in self.jobs.values():
+                if job.running or job.next_run > now or (job.leader_only and not leader):
+                    continue
+                job.running = True
+                job.next_run = now + job.interval_seconds
+                self._executor.submit(self._run, job)
+
+    def metrics(self) -> List[schemas.JobMetrics]:
+        with self._mutex:
+            return [job.metrics() for job in self.jobs.values()]
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception:  # keep the loop alive whatever a tick does
+                logger.exception("Scheduler tick failed")
+            self._stop.wait(TICK_SECONDS)
+
+    def _run(self, job: Job) -> None:
+        started = time.perf_counter()
+        started_at = datetime.now(timezone.utc)
+        error = None
+        try:
+            job.func()
+        except Exception as exc:
+            logger.exception("Scheduled job %s failed", job.name)
+            error = f"{type(exc).__name__}: {exc}"
+        with self._mutex:
+            job.running = False
+            job.runs += 1
+            job.last_started_at = started_at
+            job.last_duration_ms = (time.perf_counter() - started) * 1000
+            job.last_error = error
+            if error:
+                job.failures += 1
+
+    def _acquire_lock(self) -> bool:
+        if self.leader:
+            return True
+        handle = open(self.lock_file, "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_handle = handle
+        logger.info("Scheduler lock acquired by pid %d", os.getpid())
+        return True
+
+    def _release_lock(self) -> None:
+        handle, self._lock_handle = self._lock_handle, None
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+
+
+def refresh_fleet_summary() -> None:
+    with database.get_db() as db:
+        crud.record_fleet_summary(db)
+        for depot in crud.list_depots(db):
+            crud.record_fleet_summary(db, depot.id)
+
+
+def prune_fleet_summaries() -> None:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=FLEET_SUMMARY_RETENTION_DAYS)
+    with database.get_db() as db:
+        crud.prune_fleet_summaries(db, cutoff)
+
+
+def sync_revocations() -> None:
+    with database.get_db() as db:
+        crud.sync_revocations(db)
+
+
+def prune_revocations() -> None:
+    with database.get_db() as db:
+        crud.prune_revocations(db)
+
+
+def analyze_database() -> None:
+    with database.engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+        if connection.dialect.name == "sqlite":
+            connection.execute(text("PRAGMA optimize"))
+
+
+def compact_database() -> None:
+    # A full VACUUM would rewrite the whole file under an exclusive lock and
+    # stall every writer, so that is left to maintenance windows.
+    if database.engine.dialect.name != "sqlite":
+        return
+    connection = database.engine.raw_connection()
+    try:
+        # sqlite3's execute() steps incremental_vacuum once, freeing a single
+        # page; executescript() runs each statement to completion. A PASSIVE
+        # checkpoint copies what it can without waiting on or blocking writers,
+        # unlike TRUNCATE; journal_size_limit then caps the WAL file.
+        connection.driver_connection.executescript(
+            f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES});"
+            "PRAGMA wal_checkpoint(PASSIVE);"
+        )
+    finally:
+        connection.close()
+
+
+def build_default_scheduler(maintenance: bool = True) -> Scheduler:
+    """Build the app's scheduler; without ``maintenance`` only per-worker jobs are registered."""
+    scheduler = Scheduler(lock_file=SCHEDULER_LOCK_FILE if maintenance else None)
+    if REVOCATION_SYNC_SECONDS > 0:
+        # The lifespan has just synced, so the first run can wait a full interval.
+        scheduler.register(
+            "sync_revocations",
+            REVOCATION_SYNC_SECONDS,
+            sync_revocations,
+            initial_delay=REVOCATION_SYNC_SECONDS,
+            leader_only=False,
+        )
+    if not maintenance:
+        return scheduler
+    scheduler.register("fleet_summary", FLEET_SUMMARY_INTERVAL_SECONDS, refresh_fleet_summary)
+    scheduler.register("prune_fleet_summaries", DAY, prune_fleet_summaries, initial_delay=HOUR)
+    scheduler.register("prune_revocations", HOUR, prune_revocations, initial_delay=HOUR)
+    scheduler.register("analyze", DAY, analyze_database, initial_delay=HOUR)
+    scheduler.register("compact", DAY, compact_database, initial_delay=HOUR)
+    return scheduler
@@ -6,8 +6,10 @@ from typing import List, Optional
 from pydantic import BaseModel, ConfigDict, Field, constr
 
 
+# Default per-depot vehicle cap, overridable through Depot.max_vehicles.
 MAX_VEHICLES = 1000
 WHEEL_POSITIONS = 24
+DEFAULT_DEPOT_CODE = "MAIN"
 
 
 class Token(BaseModel):
@@ -17,11 +19,24 @@ class Token(BaseModel):
 
 class TokenPayload(BaseModel):
     sub: str
+    # Identity claims, absent from tokens issued before stateless verification.
+    uid: Optional[int] = None
+    depot: Optional[int] = None
+    su: bool = False
+    jti: Optional[str] = None
+    iat: Optional[float] = None
+    exp: Optional[float] = None
+
+
+class TokenRevoke(BaseModel):
+    jti: Optional[str] = None
+    username: Optional[str] = None
 
 
 class UserCreate(BaseModel):
     username: constr(strip_whitespace=True, min_length=3, max_length=50)
     password: constr(strip_whitespace=True, min_length=6, max_length=128)
+    depot_id: Optional[int] = None
 
 
 class UserRead(BaseModel):
@@ -29,6 +44,22 @@ class UserRead(BaseModel):
 
     id: int
     username: str
+    depot_id: Optional[int] = None
+    is_superuser: bool = False
+
+
+class DepotCreate(BaseModel):
+    code: constr(strip_whitespace=True, min_length=1, max_length=32)
+    name: Optional[str] = Field(default=None, max_length=255)
+    max_vehicles: Optional[int] = Field(default=None, ge=0)
+
+
+class DepotRead(DepotCreate):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    vehicle_count: int = 0
+    vehicle_limit: int = MAX_VEHICLES
 
 
 class VehicleBase(BaseModel):
@@ -65,6 +96,42 @@ class WheelPositionBulkUpdate(BaseModel):
     positions: List[WheelPositionBase]
 
 
+class TireSerialConflict(BaseModel):
+    tire_serial: str
+    vehicle_id: int
+    position_index: int
+
+
+class TireSerialConflictReport(BaseModel):
+    conflicts: List[TireSerialConflict]
+
+
+class FleetSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    depot_id: Optional[int] = None
+    computed_at: datetime
+    vehicle_count: int
+    wheel_position_count: int
+    installed_tire_count: int
+
+
+class JobMetrics(BaseModel):
+    name: str
+    interval_seconds: float
+    running: bool
+    runs: int
+    failures: int
+    last_started_at: Optional[datetime]
+    last_duration_ms: Optional[float]
+    last_error: Optional[str]
+
+
+class SchedulerStatus(BaseModel):
+    leader: bool
+    jobs: List[JobMetrics]
+
+
 class VehicleRead(VehicleBase):
     model_config = ConfigDict(from_attributes=True)
 
@@ -1,39 +1,193 @@
+import heapq
 import os
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional
-
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 from . import schemas
 
+# passlib/bcrypt and jose/cryptography are imported on first use so that
+# importing the app (and forking workers) stays cheap.
+
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me-please")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Signing keys as "kid=secret" pairs separated by commas. A retired key may
+# carry "@<unix timestamp>", after which tokens signed with it stop verifying:
+#   JWT_KEYS="2025b=new-secret,2025a=old-secret@1767225600" JWT_ACTIVE_KID=2025b
+# Without JWT_KEYS, SECRET_KEY is used under the "default" key id, which is
+# also assumed for tokens issued before key ids were introduced.
+LEGACY_KID = "default"
+
+
+def _load_keyring(spec: str) -> Dict[str, Tuple[str, Optional[float]]]:
+    if not spec:
+        return {LEGACY_KID: (SECRET_KEY, None)}
+    keyring = {}
+    for entry in spec.split(","):
+        kid, _, secret = entry.strip().partition("=")
+        secret, _, not_after = secret.partition("@")
+        if not kid or not secret:
+            raise ValueError(
+                f"JWT_KEYS entry {entry.strip()!r} is not of the form kid=secret[@timestamp]"
+            )
+        if kid in keyring:
+            raise ValueError(f"JWT_KEYS lists key id {kid!r} more than once")
+        try:
+            keyring[kid] = (secret, float(not_after) if not_after else None)
+        except ValueError:
+            raise ValueError(
+                f"JWT_KEYS key {kid!r} has a non-numeric expiry {not_after!r}; "
+                "use a unix timestamp"
+            ) from None
+    return keyring
+
+
+def _active_kid(keyring: Dict[str, Tuple[str, Optional[float]]], kid: Optional[str]) -> str:
+    kid = kid or next(iter(keyring))
+    if kid not in keyring:
+        raise ValueError(
+            f"JWT_ACTIVE_KID {kid!r} is not one of the JWT_KEYS ({', '.join(keyring)})"
+        )
+    not_after = keyring[kid][1]
+    if not_after is not None and not_after <= time.time():
+        raise ValueError(f"JWT_ACTIVE_KID {kid!r} names a key that has already expired")
+    return kid
+
+
+# Both raise at import, so a misconfigured key ring stops the app from starting.
+SIGNING_KEYS = _load_keyring(os.getenv("JWT_KEYS", ""))
+ACTIVE_KID = _active_kid(SIGNING_KEYS, os.getenv("JWT_ACTIVE_KID"))
+
+
+class RevocationList:
+    """In-memory set of revoked token ids and per-user cut-offs.
+
+    Entries are dropped once the tokens they cover would have expired anyway,
+    using a heap ordered by expiry, so the set stays proportional to the number
+    of live revoked tokens.
+    """
+
+    def __init__(self) -> None:
+        self._tokens: Dict[str, float] = {}
+        self._users: Dict[int, Tuple[float, float]] = {}
+        self._expiry: List[Tuple[float, str, Any]] = []
+        self._lock = threading.Lock()
+
+    def revoke_token(self, jti: str, expires_at: float) -> bool:
+        """Reject token ``jti``; returns whether this changed anything."""
+        with self._lock:
+            current = self._tokens.get(jti)
+            if current is not None and current >= expires_at:
+                return False
+            self._tokens[jti] = expires_at
+            heapq.heappush(self._expiry, (expires_at, "token", jti))
+            return True
+
+    def revoke_user(self, user_id: int, revoked_at: float, expires_at: float) -> bool:
+        """Reject tokens of ``user_id`` issued at or before ``revoked_at``.
+
+        Returns whether this changed anything.
+        """
+        with self._lock:
+            current = self._users.get(user_id)
+            if current is not None and current[0] >= revoked_at:
+                return False
+            self._users[user_id] = (revoked_at, expires_at)
+            heapq.heappush(self._expiry, (expires_at, "user", user_id))
+            return True
 
+    def is_revoked(
+        self, jti: Optional[str], user_id: Optional[int], issued_at: Optional[float]
+    ) -> bool:
+        if jti is not None and jti in self._tokens:
+            return True
+        cutoff = self._users.get(user_id) if user_id is not None else None
+        return cutoff is not None and (issued_at is None or issued_at <= cutoff[0])
 
-def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode = {"sub": subject, "exp": expire}
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    def purge(self, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, kind, key = heapq.heappop(self._expiry)
+                # A later revocation may have extended the entry; only drop it
+                # when its current expiry has passed.
+                if kind == "token":
+                    if key in self._tokens and self._tokens[key] <= now:
+                        del self._tokens[key]
+                elif key in self._users and self._users[key][1] <= now:
+                    del self._users[key]
+
+    def __len__(self) -> int:
+        return len(self._tokens) + len(self._users)
+
+
+revocations = RevocationList()
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def create_access_token(
+    subject: str,
+    expires_delta: Optional[timedelta] = None,
+    claims: Optional[Dict[str, Any]] = None,
+) -> str:
+    from jose import jwt
+
+    now = datetime.utcnow()
+    expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode = {
+        **(claims or {}),
+        "sub": subject,
+        "exp": expire,
+        # Sub-second precision so a token issued right after a per-user
+        # revocation is not caught by it.
+        "iat": time.time(),
+        "jti": uuid.uuid4().hex,
+    }
+    secret, _ = SIGNING_KEYS[ACTIVE_KID]
+    return jwt.encode(to_encode, secret, algorithm=ALGORITHM, headers={"kid": ACTIVE_KID})
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def decode_token(token: str) -> Optional[schemas.TokenPayload]:
+    """Verify ``token`` with the key named in its header and check revocations.
+
+    This is one HMAC check plus in-memory lookups; no database access.
+    """
+    from jose import JWTError, jwt
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        kid = jwt.get_unverified_header(token).get("kid", LEGACY_KID)
+        key = SIGNING_KEYS.get(kid)
+        if key is None:
+            return None
+        secret, not_after = key
+        if not_after is not None and time.time() > not_after:
+            return None
+        payload = jwt.decode(token, secret, algorithms=[ALGORITHM])
         sub = payload.get("sub")
         if sub is None:
             return None
-        return schemas.TokenPayload(sub=sub)
-    except JWTError:
+        token_payload = schemas.TokenPayload(**payload)
+    except (JWTError, ValueError):
+        return None
+    if revocations.is_revoked(token_payload.jti, token_payload.uid, token_payload.iat):
         return None
+    return token_payload
@@ -0,0 +1,224 @@
+"""Packed storage layout for wheel positions.
+
+With ``WHEEL_STORAGE=packed`` every vehicle keeps its positions in a single
+``vehicle_wheel_packs`` row instead of ``WHEEL_POSITIONS`` ``wheel_positions``
+rows. The payload is a compact JSON list with one slot per position, each slot
+either ``null`` or ``[tire_serial, installed_at]``. Installed serials are also
+kept in ``packed_tire_serials``, whose primary key stops two packs from holding
+the same tire even when the requests installing it race.
+
+That index is the price of the guarantee: packing does not reduce the total
+row count of a fully fitted fleet. With 1000 vehicles and all 24 positions
+fitted, rows mode keeps 24,000 ``wheel_positions`` rows. Packed mode keeps
+1,000 packs plus 24,000 narrow ``packed_tire_serials`` rows, i.e. 25 rows per
+vehicle, and only one row per installed tire (empty positions cost nothing).
+What packing saves is work per request: reading a vehicle loads one row
+instead of 24 ORM objects, and a write updates the pack plus only the serial
+rows that changed (one insert and/or one delete for a single install), never
+the other 23.
+
+Existing databases are converted with::
+
+    python -m app.wheel_packing pack    # wheel_positions -> vehicle_wheel_packs
+    python -m app.wheel_packing unpack  # vehicle_wheel_packs -> wheel_positions
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+logger = logging.getLogger(__name__)
+
+STORAGE_MODE = os.getenv("WHEEL_STORAGE", "rows")
+
+
+def packed_storage_enabled() -> bool:
+    return STORAGE_MODE == "packed"
+
+
+@dataclass
+class PackedWheelPosition:
+    """Detached stand-in for ``models.WheelPosition`` read from a pack."""
+
+    vehicle_id: int
+    position_index: int
+    tire_serial: Optional[str] = None
+    installed_at: Optional[datetime] = None
+
+    @property
+    def id(self) -> int:
+        # Packs have no per-position primary key; derive a stable, dense one.
+        return (self.vehicle_id - 1) * schemas.WHEEL_POSITIONS + self.position_index
+
+
+def unpack(pack: models.VehicleWheelPack) -> List[PackedWheelPosition]:
+    slots = json.loads(pack.positions)
+    positions = []
+    for offset in range(schemas.WHEEL_POSITIONS):
+        slot = slots[offset] if offset < len(slots) else None
+        position = PackedWheelPosition(vehicle_id=pack.vehicle_id, position_index=offset + 1)
+        if slot:
+            position.tire_serial = slot[0]
+            position.installed_at = datetime.fromisoformat(slot[1]) if slot[1] else None
+        positions.append(position)
+    return positions
+
+
+def pack(positions: List[PackedWheelPosition]) -> str:
+    slots: List[Optional[list]] = [None] * schemas.WHEEL_POSITIONS
+    for position in positions:
+        if position.tire_serial:
+            installed_at = position.installed_at.isoformat() if position.installed_at else None
+            slots[position.position_index - 1] = [position.tire_serial, installed_at]
+    return json.dumps(slots, separators=(",", ":"))
+
+
+def store(
+    db: Session, wheel_pack: models.VehicleWheelPack, positions: List[PackedWheelPosition]
+) -> None:
+    """Write ``positions`` into ``wheel_pack`` and keep its serial index in step.
+
+    The ``packed_tire_serials`` rows are what enforce fleet-wide serial
+    uniqueness in packed mode, so every pack write must go through here. Only
+    the serials that changed are touched; the pack's ``serials`` collection is
+    never loaded.
+    """
+    previous = {}
+    if wheel_pack.positions is not None:
+        previous = {p.tire_serial: p.position_index for p in unpack(wheel_pack) if p.tire_serial}
+    wheel_pack.positions = pack(positions)
+    installed = {p.tire_serial: p.position_index for p in positions if p.tire_serial}
+
+    removed = [tire_serial for tire_serial in previous if tire_serial not in installed]
+    if removed:
+        db.query(models.PackedTireSerial).filter(
+            models.PackedTireSerial.tire_serial.in_(removed)
+        ).delete(synchronize_session=False)
+    for tire_serial, position_index in installed.items():
+        if tire_serial not in previous:
+            db.add(
+                models.PackedTireSerial(
+                    tire_serial=tire_serial, position_index=position_index, wheel_pack=wheel_pack
+                )
+            )
+        elif previous[tire_serial] != position_index:
+            db.query(models.PackedTireSerial).filter(
+                models.PackedTireSerial.tire_serial == tire_serial
+            ).update({"position_index": position_index}, synchronize_session=False)
+
+
+def merge_rows(db: Session, vehicle: models.Vehicle) -> None:
+    """Fold ``vehicle``'s ``wheel_positions`` rows into its pack, creating it if needed.
+
+    A slot already filled in the pack wins over a row for the same position,
+    since the pack is what packed mode has been writing to. A row whose serial
+    another pack already holds is left in ``wheel_positions`` and logged rather
+    than merged, so the clash is kept for an operator to resolve instead of
+    failing every read of the vehicle.
+    """
+    rows = [wp for wp in vehicle.wheel_positions if wp.tire_serial]
+    clashing = set()
+    if rows:
+        clashing = {
+            tire_serial
+            for (tire_serial,) in db.query(models.PackedTireSerial.tire_serial).filter(
+                models.PackedTireSerial.tire_serial.in_([wp.tire_serial for wp in rows]),
+                models.PackedTireSerial.vehicle_id != vehicle.id,
+            )
+        }
+    if vehicle.wheel_pack is None:
+        positions = [
+            PackedWheelPosition(vehicle_id=vehicle.id, position_index=index)
+            for index in range(1, schemas.WHEEL_POSITIONS + 1)
+        ]
+    else:
+        positions = unpack(vehicle.wheel_pack)
+    for wp in rows:
+        if wp.tire_serial in clashing:
+            logger.warning(
+                "Tire %s at position %d of vehicle %d is already packed on another vehicle; "
+                "leaving it in wheel_positions",
+                wp.tire_serial,
+                wp.position_index,
+                vehicle.id,
+            )
+            continue
+        position = positions[wp.position_index - 1]
+        if not position.tire_serial:
+            position.tire_serial = wp.tire_serial
+            position.installed_at = wp.installed_at
+    if vehicle.wheel_pack is None:
+        wheel_pack = models.VehicleWheelPack()
+        store(db, wheel_pack, positions)
+        vehicle.wheel_pack = wheel_pack
+    else:
+        store(db, vehicle.wheel_pack, positions)
+    vehicle.wheel_positions[:] = [
+        wp for wp in vehicle.wheel_positions if wp.tire_serial in clashing
+    ]
+
+
+def pack_all(engine: Engine) -> int:
+    """Move every vehicle's ``wheel_positions`` rows into its packed row."""
+    models.Base.metadata.create_all(bind=engine)
+    moved = 0
+    with Session(engine) as db:
+        for vehicle in db.query(models.Vehicle).all():
+            if vehicle.wheel_pack is not None and not vehicle.wheel_positions:
+                continue
+            merge_rows(db, vehicle)
+            moved += 1
+        db.commit()
+    return moved
+
+
+def unpack_all(engine: Engine) -> int:
+    """Expand every packed row back into ``wheel_positions`` rows."""
+    moved = 0
+    with Session(engine) as db:
+        packs = db.query(models.VehicleWheelPack).all()
+        serials = [
+            position.tire_serial
+            for wheel_pack in packs
+            for position in unpack(wheel_pack)
+            if position.tire_serial
+        ]
+        if len(serials) != len(set(serials)):
+            raise ValueError("Packed data installs the same tire serial more than once")
+        for wheel_pack in packs:
+            vehicle = wheel_pack.vehicle
+            indexed = {wp.position_index: wp for wp in vehicle.wheel_positions}
+            for position in unpack(wheel_pack):
+                wp = indexed.get(position.position_index)
+                if wp is None:
+                    wp = models.WheelPosition(
+                        vehicle=vehicle, position_index=position.position_index
+                    )
+                    db.add(wp)
+                wp.tire_serial = position.tire_serial
+                wp.installed_at = position.installed_at
+            vehicle.wheel_pack = None
+            moved += 1
+        db.commit()
+    return moved
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    commands = {"pack": pack_all, "unpack": unpack_all}
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        sys.exit("usage: python -m app.wheel_packing {pack|unpack}")
+    count = commands[sys.argv[1]](engine)
+    print(f"{sys.argv[1]}ed {count} vehicle(s)")
@@ -14,7 +14,11 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
-from app import crud, models, schemas
+# Keep background jobs out of the test run; scheduler tests drive it directly.
+os.environ.setdefault("SCHEDULER_ENABLED", "0")
+os.environ.setdefault("REVOCATION_SYNC_SECONDS", "0")
+
+from app import crud, database, models, schemas
 from app.deps import get_db
 from app.main import app
 
@@ -26,6 +30,11 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The lifespan (init_db, revocation sync) and scheduled jobs use app.database
+# directly rather than the get_db dependency.
+database.engine = engine
+database.SessionLocal = TestingSessionLocal
+
 models.Base.metadata.create_all(bind=engine)
 
 
@@ -99,3 +99,74 @@ def test_search(client: TestClient) -> None:
     assert search_response.status_code == 200
     results = search_response.json()
     assert any("987" in item["license_plate"] for item in results)
+
+
+def test_duplicate_tire_serial_rejected(client: TestClient) -> None:
+    headers = authenticate(client)
+    first = client.post("/vehicles", json={"license_plate": "DP 001 AA"}, headers=headers).json()
+    second = client.post("/vehicles", json={"license_plate": "DP 002 AA"}, headers=headers).json()
+
+    install = client.put(
+        f"/vehicles/{first['id']}/wheel-positions/1",
+        json={"tire_serial": "DUP-1"},
+        headers=headers,
+    )
+    assert install.status_code == 200
+
+    duplicate = client.put(
+        f"/vehicles/{second['id']}/wheel-positions/1",
+        json={"tire_serial": "DUP-1"},
+        headers=headers,
+    )
+    assert duplicate.status_code == 409
+
+    payload = {
+        "positions": [
+            {"position_index": 1, "tire_serial": "DUP-1"},
+            {"position_index": 2, "tire_serial": "DUP-2"},
+            {"position_index": 3, "tire_serial": "DUP-2"},
+        ]
+    }
+    check = client.post(
+        f"/vehicles/{second['id']}/wheel-positions/bulk/conflicts", json=payload, headers=headers
+    )
+    assert check.status_code == 200
+    conflicts = check.json()["conflicts"]
+    assert {"tire_serial": "DUP-1", "vehicle_id": first["id"], "position_index": 1} in conflicts
+    assert {"tire_serial": "DUP-2", "vehicle_id": second["id"], "position_index": 3} in conflicts
+
+    bulk = client.post(
+        f"/vehicles/{second['id']}/wheel-positions/bulk", json=payload, headers=headers
+    )
+    assert bulk.status_code == 409
+
+    swap = client.post(
+        f"/vehicles/{first['id']}/wheel-positions/bulk",
+        json={
+            "positions": [
+                {"position_index": 1, "tire_serial": "DUP-3"},
+                {"position_index": 2, "tire_serial": "DUP-1"},
+            ]
+        },
+        headers=headers,
+    )
+    assert swap.status_code == 200
+    serials = {wp["position_index"]: wp["tire_serial"] for wp in swap.json()["wheel_positions"]}
+    assert serials[1] == "DUP-3"
+    assert serials[2] == "DUP-1"
+
+
+def test_unrelated_integrity_errors_are_not_conflicts() -> None:
+    from sqlalchemy.exc import IntegrityError
+
+    from app.main import integrity_error_handler
+
+    error = IntegrityError(
+        "INSERT", {}, Exception("NOT NULL constraint failed: vehicles.license_plate")
+    )
+    try:
+        integrity_error_handler(None, error)
+    except IntegrityError as raised:
+        assert raised is error
+    else:
+        raise AssertionError("NOT NULL violation was reported as a conflict")
@@ -0,0 +1,416 @@
+"""Concurrency stress tests for the write paths.
+
+Unlike the rest of the suite these run against a file-backed SQLite database
+(and, when ``STRESS_DATABASE_URL`` points at one, a scratch PostgreSQL
+database) from many threads and processes at once. The defaults keep the run
+short; raise ``STRESS_THREADS``, ``STRESS_PROCESSES`` and ``STRESS_ITERATIONS``
+to hammer harder. Run with ``-s`` to see the throughput of each scenario.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, models, schemas, security, wheel_packing
+from app.deps import get_db
+from app.main import app
+
+THREADS = int(os.getenv("STRESS_THREADS", "8"))
+PROCESSES = int(os.getenv("STRESS_PROCESSES", "3"))
+ITERATIONS = int(os.getenv("STRESS_ITERATIONS", "10"))
+MAX_RETRIES = 50
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def database_url(request: pytest.FixtureRequest, tmp_path) -> str:
+    if request.param == "sqlite":
+        return f"sqlite:///{tmp_path / 'stress.db'}"
+    url = os.getenv("STRESS_DATABASE_URL")
+    if not url:
+        pytest.skip("STRESS_DATABASE_URL is not set")
+    return url
+
+
+@pytest.fixture()
+def stress_db(database_url: str):
+    engine = database.create_db_engine(database_url)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    _override_db(session_factory)
+    with session_factory() as db:
+        crud.create_user(db, schemas.UserCreate(username="stress", password="secret123"))
+    yield session_factory
+    app.dependency_overrides.clear()
+    models.Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture(params=["rows", "packed"])
+def storage_mode(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> str:
+    monkeypatch.setattr(wheel_packing, "STORAGE_MODE", request.param)
+    return request.param
+
+
+def _override_db(session_factory: sessionmaker) -> None:
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+
+
+def _headers() -> Dict[str, str]:
+    return {"Authorization": f"Bearer {security.create_access_token('stress')}"}
+
+
+def _call(client: TestClient, outcomes: Counter, request: Callable[[TestClient], object]):
+    """Run one request, tallying its status code, lock timeouts and server errors."""
+    try:
+        response = request(client)
+    except OperationalError as exc:
+        outcomes["locked" if "locked" in str(exc) else "operational_error"] += 1
+        return None
+    except Exception as exc:  # surfaced by TestClient for unhandled server errors
+        outcomes[f"error:{type(exc).__name__}"] += 1
+        return None
+    outcomes[response.status_code] += 1
+    return response
+
+
+def _retrying(client: TestClient, outcomes: Counter, request: Callable[[TestClient], object]):
+    """Retry 409s, which are how concurrent packed-row updates are rejected."""
+    for _ in range(MAX_RETRIES):
+        response = _call(client, outcomes, request)
+        if response is None or response.status_code != 409:
+            return response
+    return response
+
+
+def _report(name: str, operations: int, started: float, outcomes: Counter) -> None:
+    elapsed = time.perf_counter() - started
+    print(
+        f"\n[stress] {name}: {operations} ops in {elapsed:.2f}s "
+        f"({operations / elapsed:.0f} ops/s), outcomes {dict(outcomes)}"
+    )
+
+
+def _assert_clean(outcomes: Counter) -> None:
+    failures = {key: count for key, count in outcomes.items() if isinstance(key, str)}
+    assert failures == {}, f"lock timeouts or server errors: {failures}"
+    assert outcomes[500] == 0
+
+
+def _create_vehicle(plate: str) -> int:
+    client = TestClient(app)
+    response = client.post("/vehicles", json={"license_plate": plate}, headers=_headers())
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def _final_serials(session_factory: sessionmaker, vehicle_id: int) -> Dict[int, str]:
+    with session_factory() as db:
+        vehicle = crud.get_vehicle(db, vehicle_id)
+        positions = crud.get_wheel_positions(db, vehicle)
+        assert len(positions) == schemas.WHEEL_POSITIONS
+        return {wp.position_index: wp.tire_serial for wp in positions}
+
+
+def _install_positions(
+    vehicle_id: int, positions: List[int], iterations: int, tag: str
+) -> Tuple[Dict[int, str], Counter]:
+    """Install a fresh serial at each owned position ``iterations`` times."""
+    client = TestClient(app)
+    headers = _headers()
+    outcomes: Counter = Counter()
+    acknowledged: Dict[int, str] = {}
+    for iteration in range(iterations):
+        for position in positions:
+            serial = f"{tag}-{position}-{iteration}"
+            response = _retrying(
+                client,
+                outcomes,
+                lambda c: c.put(
+                    f"/vehicles/{vehicle_id}/wheel-positions/{position}",
+                    json={"tire_serial": serial},
+                    headers=headers,
+                ),
+            )
+            if response is not None and response.status_code == 200:
+                acknowledged[position] = serial
+    return acknowledged, outcomes
+
+
+def _owned_positions(worker: int, workers: int) -> List[int]:
+    return list(range(worker + 1, schemas.WHEEL_POSITIONS + 1, workers))
+
+
+def test_concurrent_installs_keep_every_write(stress_db, storage_mode: str) -> None:
+    vehicle_id = _create_vehicle("ST 001 AA")
+    workers = min(THREADS, schemas.WHEEL_POSITIONS)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(
+            pool.map(
+                lambda worker: _install_positions(
+                    vehicle_id, _owned_positions(worker, workers), ITERATIONS, f"T{worker}"
+                ),
+                range(workers),
+            )
+        )
+
+    outcomes = sum((result[1] for result in results), Counter())
+    _report(f"install/{storage_mode}", schemas.WHEEL_POSITIONS * ITERATIONS, started, outcomes)
+    _assert_clean(outcomes)
+    acknowledged = {}
+    for result in results:
+        acknowledged.update(result[0])
+    assert len(acknowledged) == schemas.WHEEL_POSITIONS
+    # Each position has a single writer, so its last acknowledged serial must stick.
+    assert _final_serials(stress_db, vehicle_id) == acknowledged
+
+
+def _process_worker(
+    database_url: str,
+    storage_mode: str,
+    vehicle_id: int,
+    positions: List[int],
+    iterations: int,
+    tag: str,
+) -> Tuple[Dict[int, str], Counter]:
+    # Forked children must not reuse the parent's pooled connections.
+    wheel_packing.STORAGE_MODE = storage_mode
+    engine = database.create_db_engine(database_url)
+    _override_db(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    try:
+        return _install_positions(vehicle_id, positions, iterations, tag)
+    finally:
+        engine.dispose()
+
+
+def test_concurrent_installs_across_processes(
+    stress_db, storage_mode: str, database_url: str
+) -> None:
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("requires the fork start method")
+    vehicle_id = _create_vehicle("ST 002 AA")
+    workers = min(PROCESSES, schemas.WHEEL_POSITIONS)
+    started = time.perf_counter()
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        results = pool.starmap(
+            _process_worker,
+            [
+                (
+                    database_url,
+                    storage_mode,
+                    vehicle_id,
+                    _owned_positions(worker, workers),
+                    ITERATIONS,
+                    f"P{worker}",
+                )
+                for worker in range(workers)
+            ],
+        )
+
+    outcomes = sum((result[1] for result in results), Counter())
+    _report(f"process install/{storage_mode}", schemas.WHEEL_POSITIONS * ITERATIONS, started, outcomes)
+    _assert_clean(outcomes)
+    acknowledged = {}
+    for result in results:
+        acknowledged.update(result[0])
+    assert _final_serials(stress_db, vehicle_id) == acknowledged
+
+
+def test_concurrent_bulk_updates_are_atomic(stress_db, storage_mode: str) -> None:
+    vehicle_id = _create_vehicle("ST 003 AA")
+    outcomes: Counter = Counter()
+    lock = threading.Lock()
+
+    def bulk_writer(worker: int) -> None:
+        client = TestClient(app)
+        headers = _headers()
+        local: Counter = Counter()
+        for iteration in range(ITERATIONS):
+            payload = {
+                "positions": [
+                    {"position_index": index, "tire_serial": f"B{worker}.{iteration}-{index}"}
+                    for index in range(1, schemas.WHEEL_POSITIONS + 1)
+                ]
+            }
+            _retrying(
+                client,
+                local,
+                lambda c: c.post(
+                    f"/vehicles/{vehicle_id}/wheel-positions/bulk", json=payload, headers=headers
+                ),
+            )
+        with lock:
+            outcomes.update(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(bulk_writer, range(THREADS)))
+
+    _report(f"bulk/{storage_mode}", THREADS * ITERATIONS, started, outcomes)
+    _assert_clean(outcomes)
+    assert outcomes[200] == THREADS * ITERATIONS
+    serials = _final_serials(stress_db, vehicle_id).values()
+    # The final state must come from exactly one payload, never a mix.
+    assert len({serial.rsplit("-", 1)[0] for serial in serials}) == 1
+
+
+def test_first_touch_creates_each_position_once(stress_db) -> None:
+    with stress_db() as db:
+        depot_id = crud.get_default_depot(db).id
+        for number in range(THREADS):
+            db.execute(
+                text("INSERT INTO vehicles (license_plate, depot_id) VALUES (:plate, :depot_id)"),
+                {"plate": f"LG {number:03d} AA", "depot_id": depot_id},
+            )
+        db.commit()
+        vehicle_ids = [vehicle.id for vehicle in crud.list_vehicles(db)]
+
+    outcomes: Counter = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(THREADS)
+
+    def first_touch(worker: int) -> None:
+        client = TestClient(app)
+        headers = _headers()
+        local: Counter = Counter()
+        barrier.wait()
+        for vehicle_id in vehicle_ids:
+            if worker % 2:
+                _call(client, local, lambda c: c.get(f"/vehicles/{vehicle_id}", headers=headers))
+            else:
+                _call(
+                    client,
+                    local,
+                    lambda c: c.put(
+                        f"/vehicles/{vehicle_id}/wheel-positions/{worker + 1}",
+                        json={"tire_serial": f"FT-{vehicle_id}-{worker}"},
+                        headers=headers,
+                    ),
+                )
+        with lock:
+            outcomes.update(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(first_touch, range(THREADS)))
+
+    _report("first touch", THREADS * len(vehicle_ids), started, outcomes)
+    _assert_clean(outcomes)
+    assert outcomes[200] == THREADS * len(vehicle_ids)
+    with stress_db() as db:
+        duplicates = db.execute(
+            text(
+                "SELECT vehicle_id, position_index FROM wheel_positions "
+                "GROUP BY vehicle_id, position_index HAVING COUNT(*) > 1"
+            )
+        ).all()
+        assert duplicates == []
+        assert db.query(models.WheelPosition).count() == len(vehicle_ids) * schemas.WHEEL_POSITIONS
+    for vehicle_id in vehicle_ids:
+        serials = _final_serials(stress_db, vehicle_id)
+        for worker in range(0, THREADS, 2):
+            assert serials[worker + 1] == f"FT-{vehicle_id}-{worker}"
+
+
+def test_same_serial_is_installed_once(stress_db, storage_mode: str) -> None:
+    vehicle_ids = [_create_vehicle(f"DS {number:03d} AA") for number in range(THREADS)]
+    outcomes: Counter = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(THREADS)
+
+    def installer(worker: int) -> None:
+        client = TestClient(app)
+        headers = _headers()
+        local: Counter = Counter()
+        for iteration in range(ITERATIONS):
+            barrier.wait()
+            _call(
+                client,
+                local,
+                lambda c: c.put(
+                    f"/vehicles/{vehicle_ids[worker]}/wheel-positions/1",
+                    json={"tire_serial": f"DUP-{iteration}"},
+                    headers=headers,
+                ),
+            )
+        with lock:
+            outcomes.update(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(installer, range(THREADS)))
+
+    _report(f"duplicate serial/{storage_mode}", THREADS * ITERATIONS, started, outcomes)
+    _assert_clean(outcomes)
+    # Every round races all workers for one serial: exactly one may win it.
+    assert outcomes[200] == ITERATIONS
+    assert outcomes[409] == (THREADS - 1) * ITERATIONS
+    installed = Counter(
+        serial
+        for vehicle_id in vehicle_ids
+        for serial in _final_serials(stress_db, vehicle_id).values()
+        if serial
+    )
+    assert set(installed.values()) == {1}
+
+
+def test_concurrent_vehicle_creation_respects_plate_and_cap(stress_db) -> None:
+    limit = 5
+    with stress_db() as db:
+        depot = crud.get_default_depot(db)
+        depot.max_vehicles = limit
+        db.commit()
+
+    outcomes: Counter = Counter()
+    created: List[str] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(THREADS)
+
+    def creator(worker: int) -> None:
+        client = TestClient(app)
+        headers = _headers()
+        local: Counter = Counter()
+        barrier.wait()
+        for plate in ("CP 000 AA", f"CP {worker + 1:03d} AA"):
+            response = _call(
+                client,
+                local,
+                lambda c: c.post("/vehicles", json={"license_plate": plate}, headers=headers),
+            )
+            if response is not None and response.status_code == 201:
+                with lock:
+                    created.append(plate)
+        with lock:
+            outcomes.update(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(creator, range(THREADS)))
+
+    _report("create vehicle", THREADS * 2, started, outcomes)
+    _assert_clean(outcomes)
+    assert set(outcomes) <= {201, 400, 409}
+    assert created.count("CP 000 AA") <= 1
+    with stress_db() as db:
+        assert crud.count_vehicles(db) == len(created)
+        assert len(created) == min(limit, THREADS + 1)
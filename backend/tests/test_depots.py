@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import Dict
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect, text
+
+from app import crud, migrations, schemas, security
+
+from conftest import TestingSessionLocal
+
+
+def _login(client: TestClient, username: str, password: str) -> Dict[str, str]:
+    response = client.post("/auth/login", data={"username": username, "password": password})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_vehicles_are_scoped_to_depot(client: TestClient) -> None:
+    with TestingSessionLocal() as db:
+        depot = crud.create_depot(db, schemas.DepotCreate(code="DLA", max_vehicles=1))
+        crud.create_user(
+            db, schemas.UserCreate(username="douala", password="secret123", depot_id=depot.id)
+        )
+        other_depot_id = crud.create_depot(db, schemas.DepotCreate(code="YDE")).id
+        crud.create_user(
+            db,
+            schemas.UserCreate(username="yaounde", password="secret123", depot_id=other_depot_id),
+        )
+
+    douala = _login(client, "douala", "secret123")
+    yaounde = _login(client, "yaounde", "secret123")
+
+    created = client.post("/vehicles", json={"license_plate": "DL 001 AA"}, headers=douala)
+    assert created.status_code == 201
+    vehicle_id = created.json()["id"]
+
+    over_limit = client.post("/vehicles", json={"license_plate": "DL 002 AA"}, headers=douala)
+    assert over_limit.status_code == 400
+    assert client.post(
+        "/vehicles", json={"license_plate": "YD 001 AA"}, headers=yaounde
+    ).status_code == 201
+
+    plates = [item["license_plate"] for item in client.get("/vehicles", headers=yaounde).json()]
+    assert plates == ["YD 001 AA"]
+    assert client.get(f"/vehicles/{vehicle_id}", headers=yaounde).status_code == 404
+    assert (
+        client.put(
+            f"/vehicles/{vehicle_id}/wheel-positions/1",
+            json={"tire_serial": "DEPOT-1"},
+            headers=yaounde,
+        ).status_code
+        == 404
+    )
+
+    current = client.get("/depots/current", headers=douala).json()
+    assert current["code"] == "DLA"
+    assert current["vehicle_count"] == 1
+    assert current["vehicle_limit"] == 1
+
+    summary = client.get("/fleet/summary", headers=yaounde).json()
+    assert summary["depot_id"] == other_depot_id
+    assert summary["vehicle_count"] == 1
+
+
+def test_creating_vehicle_in_missing_depot_is_not_found(client: TestClient) -> None:
+    with TestingSessionLocal() as db:
+        user = crud.get_user_by_username(db, "tester")
+        # A token issued before its depot was removed still carries the old id.
+        token = security.create_access_token(
+            user.username, claims={"uid": user.id, "depot": 987654, "su": False}
+        )
+    response = client.post(
+        "/vehicles",
+        json={"license_plate": "GH 001 AA"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Depot not found"
+
+
+def test_migration_assigns_default_depot(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.execute(
+            text("CREATE TABLE vehicles (id INTEGER PRIMARY KEY, license_plate VARCHAR(32))")
+        )
+        connection.execute(
+            text(
+                "CREATE TABLE wheel_positions (id INTEGER PRIMARY KEY, vehicle_id INTEGER, "
+                "position_index INTEGER, tire_serial VARCHAR(64), installed_at DATETIME)"
+            )
+        )
+        connection.execute(text("INSERT INTO vehicles (license_plate) VALUES ('LG 001 AA')"))
+
+    migrations.apply_migrations(engine)
+
+    inspector = inspect(engine)
+    assert "ix_vehicles_depot_plate" in {
+        index["name"] for index in inspector.get_indexes("vehicles")
+    }
+    with engine.connect() as connection:
+        depot_id = connection.execute(
+            text("SELECT id FROM depots WHERE code = :code"), {"code": schemas.DEFAULT_DEPOT_CODE}
+        ).scalar()
+        assert connection.execute(text("SELECT depot_id FROM vehicles")).scalar() == depot_id
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import crud, database, init_db, migrations, schemas
+
+
+@pytest.fixture()
+def fresh_engine(monkeypatch: pytest.MonkeyPatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine))
+    return engine
+
+
+def test_check_only_skips_current_schema(fresh_engine, monkeypatch: pytest.MonkeyPatch) -> None:
+    timings = init_db.init_db(check_only=True)
+    assert set(timings) == {"schema", "default_admin"}
+    assert migrations.get_schema_version(fresh_engine) == migrations.SCHEMA_VERSION
+
+    calls = []
+    monkeypatch.setattr(migrations, "apply_migrations", lambda engine: calls.append(engine))
+    init_db.init_db(check_only=True)
+    assert calls == []
+    init_db.init_db()
+    assert calls == [fresh_engine]
+
+
+def test_concurrent_start_reuses_admin_created_by_another_worker(
+    fresh_engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    init_db.init_db()
+    # The count runs before the other worker's insert commits.
+    monkeypatch.setattr(crud, "count_users", lambda db: 0)
+    init_db.init_db()
+    with database.get_db() as db:
+        assert crud.get_user_by_username(db, init_db.DEFAULT_USERNAME).is_superuser
+
+
+def test_default_admin_is_only_created_on_a_new_database(fresh_engine) -> None:
+    init_db.init_db()
+    with database.get_db() as db:
+        crud.create_user(db, schemas.UserCreate(username="operator", password="secret123"))
+        db.delete(crud.get_user_by_username(db, init_db.DEFAULT_USERNAME))
+        db.commit()
+
+    init_db.init_db()
+    with database.get_db() as db:
+        assert crud.get_user_by_username(db, init_db.DEFAULT_USERNAME) is None
+        assert not crud.get_user_by_username(db, "operator").is_superuser
+
+    assert init_db.grant_superuser("operator")
+    assert not init_db.grant_superuser("missing")
+    with database.get_db() as db:
+        assert crud.get_user_by_username(db, "operator").is_superuser
+
+
+def test_importing_app_skips_heavy_security_modules() -> None:
+    code = (
+        "import sys, app.main; "
+        "print(sorted(m for m in ('jose', 'passlib', 'cryptography') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
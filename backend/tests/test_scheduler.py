@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app import database, migrations, scheduler
+from app.scheduler import Scheduler
+
+from test_api import authenticate
+
+
+def _wait_for(predicate, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_jobs_run_on_leader_only(tmp_path) -> None:
+    lock_file = str(tmp_path / "scheduler.lock")
+    leader = Scheduler(workers=1, lock_file=lock_file)
+    follower = Scheduler(workers=1, lock_file=lock_file)
+    calls = []
+
+    def failing() -> None:
+        raise RuntimeError("boom")
+
+    for scheduler in (leader, follower):
+        scheduler.register("record", 3600, lambda owner=scheduler: calls.append(owner))
+        scheduler.register("failing", 3600, failing)
+        # Drive ticks by hand instead of starting the background loop.
+        scheduler._executor = ThreadPoolExecutor(max_workers=1)
+
+    leader.run_pending()
+    follower.run_pending()
+    _wait_for(lambda: all(job.runs for job in leader.jobs.values()))
+    leader.run_pending()  # not due again yet
+    assert calls == [leader]
+    assert leader.leader and not follower.leader
+
+    metrics = {job.name: job for job in leader.metrics()}
+    assert metrics["record"].runs == 1 and metrics["record"].failures == 0
+    assert metrics["failing"].failures == 1
+    assert metrics["failing"].last_error == "RuntimeError: boom"
+
+    leader.shutdown()
+    follower.run_pending()
+    _wait_for(lambda: follower.jobs["record"].runs)
+    assert calls == [leader, follower]
+    follower.shutdown()
+
+
+def test_fleet_summary(client: TestClient) -> None:
+    headers = authenticate(client)
+    vehicle = client.post("/vehicles", json={"license_plate": "FS 001 AA"}, headers=headers).json()
+    client.put(
+        f"/vehicles/{vehicle['id']}/wheel-positions/1",
+        json={"tire_serial": "FS-1"},
+        headers=headers,
+    )
+    response = client.get("/fleet/summary", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["vehicle_count"] >= 1
+    assert body["wheel_position_count"] == body["vehicle_count"] * 24
+    assert body["installed_tire_count"] >= 1
+
+    jobs = client.get("/scheduler/jobs", headers=headers)
+    assert jobs.json() == {"leader": False, "jobs": []}
+
+
+def test_compact_database_checkpoints_and_frees_pages(
+    tmp_path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "compact.db"
+    engine = database.create_db_engine(f"sqlite:///{path}")
+    monkeypatch.setattr(database, "engine", engine)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (payload TEXT)"))
+        for _ in range(500):
+            connection.execute(text("INSERT INTO items VALUES (:p)"), {"p": "x" * 1000})
+        connection.execute(text("DELETE FROM items"))
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+        assert connection.execute(text("PRAGMA freelist_count")).scalar() > 0
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+    size_before = os.path.getsize(path)
+
+    scheduler.compact_database()
+
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA freelist_count")).scalar() == 0
+    # The freed pages only leave the main file once the checkpoint has run.
+    assert os.path.getsize(path) < size_before
+    engine.dispose()
+
+
+def test_migration_enables_incremental_auto_vacuum_on_existing_files(tmp_path) -> None:
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE items (payload TEXT)")
+        connection.execute("INSERT INTO items VALUES ('kept')")
+    engine = database.create_db_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA auto_vacuum")).scalar() == 0
+
+    migrations.apply_migrations(engine)
+
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+        assert connection.execute(text("SELECT payload FROM items")).scalar() == "kept"
+    engine.dispose()
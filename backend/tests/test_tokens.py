@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app import crud, models, scheduler, schemas, security
+
+from conftest import TestingSessionLocal
+from test_api import authenticate
+
+
+def test_rotated_keys_verify_during_grace_window(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(security, "SIGNING_KEYS", {"old": ("old-secret", None)})
+    monkeypatch.setattr(security, "ACTIVE_KID", "old")
+    old_token = security.create_access_token("tester", claims={"uid": 1})
+    assert jwt.get_unverified_header(old_token)["kid"] == "old"
+
+    grace_until = time.time() + 60
+    monkeypatch.setattr(
+        security,
+        "SIGNING_KEYS",
+        {"new": ("new-secret", None), "old": ("old-secret", grace_until)},
+    )
+    monkeypatch.setattr(security, "ACTIVE_KID", "new")
+    new_token = security.create_access_token("tester", claims={"uid": 1})
+    assert security.decode_token(old_token).sub == "tester"
+    assert security.decode_token(new_token).sub == "tester"
+
+    monkeypatch.setitem(security.SIGNING_KEYS, "old", ("old-secret", time.time() - 1))
+    assert security.decode_token(old_token) is None
+    assert security.decode_token(new_token) is not None
+
+    forged = jwt.encode({"sub": "tester"}, "other", algorithm="HS256", headers={"kid": "new"})
+    assert security.decode_token(forged) is None
+
+
+@pytest.mark.parametrize(
+    ("spec", "message"),
+    [
+        ("=secret", "not of the form"),
+        ("a=", "not of the form"),
+        ("a=one,a=two", "more than once"),
+        ("a=secret@tomorrow", "non-numeric expiry"),
+    ],
+)
+def test_malformed_keyring_is_rejected(spec: str, message: str) -> None:
+    with pytest.raises(ValueError, match=message):
+        security._load_keyring(spec)
+
+
+def test_active_kid_must_name_a_live_key() -> None:
+    keyring = security._load_keyring(f"new=n,old=o@{time.time() - 1:.0f}")
+    assert security._active_kid(keyring, None) == "new"
+    with pytest.raises(ValueError, match="not one of"):
+        security._active_kid(keyring, "missing")
+    with pytest.raises(ValueError, match="already expired"):
+        security._active_kid(keyring, "old")
+
+
+def test_legacy_tokens_without_kid_still_verify() -> None:
+    legacy = jwt.encode(
+        {"sub": "tester", "exp": time.time() + 60}, security.SECRET_KEY, algorithm="HS256"
+    )
+    payload = security.decode_token(legacy)
+    assert payload.sub == "tester"
+    assert payload.uid is None
+
+
+def test_user_revocation_covers_legacy_tokens(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(security, "revocations", security.RevocationList())
+    legacy = jwt.encode(
+        {"sub": "tester", "exp": time.time() + 60}, security.SECRET_KEY, algorithm="HS256"
+    )
+    headers = {"Authorization": f"Bearer {legacy}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    with TestingSessionLocal() as db:
+        crud.revoke_user_tokens(db, crud.get_user_by_username(db, "tester"))
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_logout_ends_legacy_token_sessions(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(security, "revocations", security.RevocationList())
+    legacy = jwt.encode(
+        {"sub": "tester", "iat": time.time() - 1, "exp": time.time() + 60},
+        security.SECRET_KEY,
+        algorithm="HS256",
+    )
+    headers = {"Authorization": f"Bearer {legacy}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    assert client.post("/auth/logout", headers=headers).status_code == 204
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_revocation_list_expires_entries() -> None:
+    revocations = security.RevocationList()
+    now = time.time()
+    revocations.revoke_token("a", now + 10)
+    revocations.revoke_user(7, revoked_at=now, expires_at=now + 20)
+    assert revocations.is_revoked("a", None, None)
+    assert revocations.is_revoked(None, 7, now - 1)
+    assert not revocations.is_revoked(None, 7, now + 1)
+
+    revocations.purge(now + 15)
+    assert not revocations.is_revoked("a", None, None)
+    assert len(revocations) == 1
+    revocations.purge(now + 25)
+    assert len(revocations) == 0
+
+
+def test_logout_and_user_revocation(client: TestClient) -> None:
+    first = authenticate(client)
+    second = authenticate(client)
+    assert client.get("/auth/me", headers=first).json()["username"] == "tester"
+
+    assert client.post("/auth/logout", headers=first).status_code == 204
+    assert client.get("/auth/me", headers=first).status_code == 401
+    assert client.get("/auth/me", headers=second).status_code == 200
+
+    assert client.post("/auth/revoke", json={}, headers=second).status_code == 204
+    assert client.get("/auth/me", headers=second).status_code == 401
+
+    fresh = authenticate(client)
+    assert client.get("/auth/me", headers=fresh).status_code == 200
+    assert (
+        client.post("/auth/revoke", json={"username": "someone-else"}, headers=fresh).status_code
+        == 403
+    )
+
+
+def test_revoke_single_token_by_jti(client: TestClient) -> None:
+    with TestingSessionLocal() as db:
+        chief = crud.get_user_by_username(db, "chief") or crud.create_user(
+            db, schemas.UserCreate(username="chief", password="secret123")
+        )
+        chief.is_superuser = True
+        db.commit()
+        tokens = [crud.create_user_token(chief) for _ in range(2)]
+    kept, revoked = ({"Authorization": f"Bearer {token}"} for token in tokens)
+    revoked_jti = security.decode_token(tokens[1]).jti
+
+    member = authenticate(client)
+    assert (
+        client.post("/auth/revoke", json={"jti": revoked_jti}, headers=member).status_code == 403
+    )
+    assert client.post("/auth/revoke", json={"jti": revoked_jti}, headers=kept).status_code == 204
+    assert client.get("/auth/me", headers=revoked).status_code == 401
+    assert client.get("/auth/me", headers=kept).status_code == 200
+
+    # Anyone may revoke the token they are calling with.
+    own_jti = security.decode_token(member["Authorization"].split()[1]).jti
+    assert client.post("/auth/revoke", json={"jti": own_jti}, headers=member).status_code == 204
+    assert client.get("/auth/me", headers=member).status_code == 401
+
+
+def test_revocations_sync_from_database(monkeypatch: pytest.MonkeyPatch) -> None:
+    with TestingSessionLocal() as db:
+        user = crud.get_user_by_username(db, "tester")
+        token = crud.create_user_token(user)
+        crud.revoke_user_tokens(db, user)
+
+        # Another worker starts with an empty list and catches up from the table.
+        monkeypatch.setattr(security, "revocations", security.RevocationList())
+        assert security.decode_token(token) is not None
+        assert crud.sync_revocations(db) >= 1
+        assert security.decode_token(token) is None
+        assert crud.sync_revocations(db) == 0
+
+
+def test_sync_picks_up_rows_committed_out_of_id_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(security, "revocations", security.RevocationList())
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+    with TestingSessionLocal() as db:
+        for row_id, jti in ((10_000, "late-high-id"), (9_000, "early-low-id")):
+            db.add(
+                models.TokenRevocation(
+                    id=row_id, jti=jti, revoked_at=datetime.now(timezone.utc), expires_at=expires_at
+                )
+            )
+            db.commit()
+            crud.sync_revocations(db)
+    assert security.revocations.is_revoked("late-high-id", None, None)
+    assert security.revocations.is_revoked("early-low-id", None, None)
+
+
+def test_revocation_sync_runs_without_maintenance_jobs(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(scheduler, "REVOCATION_SYNC_SECONDS", 5)
+    assert set(scheduler.build_default_scheduler(maintenance=False).jobs) == {"sync_revocations"}
+    assert "sync_revocations" in scheduler.build_default_scheduler().jobs
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app import crud, migrations, models, wheel_packing
+
+import conftest
+from conftest import TestingSessionLocal
+from test_api import authenticate
+
+
+@pytest.fixture()
+def packed_mode(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(wheel_packing, "STORAGE_MODE", "packed")
+
+
+def test_packed_vehicle_lifecycle(client: TestClient, packed_mode: None) -> None:
+    headers = authenticate(client)
+    vehicle = client.post("/vehicles", json={"license_plate": "PK 100 AA"}, headers=headers).json()
+    vehicle_id = vehicle["id"]
+    assert len(vehicle["wheel_positions"]) == 24
+    assert all(wp["tire_serial"] is None for wp in vehicle["wheel_positions"])
+
+    install = client.put(
+        f"/vehicles/{vehicle_id}/wheel-positions/5",
+        json={"tire_serial": "PACK-5"},
+        headers=headers,
+    )
+    assert install.status_code == 200
+    assert install.json()["position_index"] == 5
+    assert install.json()["installed_at"] is not None
+
+    bulk = client.post(
+        f"/vehicles/{vehicle_id}/wheel-positions/bulk",
+        json={"positions": [{"position_index": 6, "tire_serial": "PACK-6"}]},
+        headers=headers,
+    )
+    assert bulk.status_code == 200
+    serials = {wp["position_index"]: wp["tire_serial"] for wp in bulk.json()["wheel_positions"]}
+    assert serials[5] == "PACK-5"
+    assert serials[6] == "PACK-6"
+
+    other = client.post("/vehicles", json={"license_plate": "PK 101 AA"}, headers=headers).json()
+    duplicate = client.put(
+        f"/vehicles/{other['id']}/wheel-positions/1",
+        json={"tire_serial": "PACK-5"},
+        headers=headers,
+    )
+    assert duplicate.status_code == 409
+
+    removed = client.delete(f"/vehicles/{vehicle_id}/wheel-positions/5", headers=headers)
+    assert removed.json()["tire_serial"] is None
+
+    # Out-of-range indexes must not wrap around to the end of the pack.
+    client.put(
+        f"/vehicles/{vehicle_id}/wheel-positions/24",
+        json={"tire_serial": "PACK-24"},
+        headers=headers,
+    )
+    for index in (0, -1, 25):
+        missing = client.delete(f"/vehicles/{vehicle_id}/wheel-positions/{index}", headers=headers)
+        assert missing.status_code == 404
+    last = client.get(f"/vehicles/{vehicle_id}", headers=headers).json()["wheel_positions"][-1]
+    assert last["tire_serial"] == "PACK-24"
+
+    with TestingSessionLocal() as db:
+        rows = db.query(models.WheelPosition).filter(models.WheelPosition.vehicle_id == vehicle_id)
+        assert rows.count() == 0
+
+
+def test_pack_and_unpack_round_trip() -> None:
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        vehicle = models.Vehicle(license_plate="RT 001 AA")
+        vehicle.wheel_positions = [
+            models.WheelPosition(position_index=index) for index in range(1, 25)
+        ]
+        vehicle.wheel_positions[2].tire_serial = "RT-3"
+        db.add(vehicle)
+        db.commit()
+
+    assert wheel_packing.pack_all(engine) == 1
+    with Session(engine) as db:
+        assert db.query(models.WheelPosition).count() == 0
+        positions = wheel_packing.unpack(db.query(models.VehicleWheelPack).one())
+        assert positions[2].tire_serial == "RT-3"
+        serial = db.query(models.PackedTireSerial).one()
+        assert (serial.tire_serial, serial.position_index) == ("RT-3", 3)
+
+    assert wheel_packing.unpack_all(engine) == 1
+    with Session(engine) as db:
+        assert db.query(models.VehicleWheelPack).count() == 0
+        assert db.query(models.PackedTireSerial).count() == 0
+        rows = db.query(models.WheelPosition).order_by(models.WheelPosition.position_index).all()
+        assert len(rows) == 24
+        assert rows[2].tire_serial == "RT-3"
+
+
+def test_packed_mode_keeps_rows_recorded_before_the_switch(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    headers = authenticate(client)
+    vehicle_id = client.post(
+        "/vehicles", json={"license_plate": "PK 200 AA"}, headers=headers
+    ).json()["id"]
+    client.put(
+        f"/vehicles/{vehicle_id}/wheel-positions/3",
+        json={"tire_serial": "ROWS-3"},
+        headers=headers,
+    )
+
+    monkeypatch.setattr(wheel_packing, "STORAGE_MODE", "packed")
+    positions = client.get(f"/vehicles/{vehicle_id}", headers=headers).json()["wheel_positions"]
+    assert positions[2]["tire_serial"] == "ROWS-3"
+    with TestingSessionLocal() as db:
+        assert db.get(models.VehicleWheelPack, vehicle_id) is not None
+        rows = db.query(models.WheelPosition).filter(models.WheelPosition.vehicle_id == vehicle_id)
+        assert rows.count() == 0
+
+
+def test_unpacked_rows_count_as_installed_in_packed_mode(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    headers = authenticate(client)
+    first, second = (
+        client.post("/vehicles", json={"license_plate": plate}, headers=headers).json()["id"]
+        for plate in ("MX 001 AA", "MX 002 AA")
+    )
+    client.put(
+        f"/vehicles/{first}/wheel-positions/1", json={"tire_serial": "MIXED-1"}, headers=headers
+    )
+
+    # Switched to packed storage without running ``pack``: the first vehicle's
+    # tire only lives in its rows until it is next read.
+    monkeypatch.setattr(wheel_packing, "STORAGE_MODE", "packed")
+    duplicate = client.put(
+        f"/vehicles/{second}/wheel-positions/3", json={"tire_serial": "MIXED-1"}, headers=headers
+    )
+    assert duplicate.status_code == 409
+    assert duplicate.json()["detail"][0]["vehicle_id"] == first
+
+    read = client.get(f"/vehicles/{first}", headers=headers)
+    assert read.status_code == 200
+    assert read.json()["wheel_positions"][0]["tire_serial"] == "MIXED-1"
+
+
+def test_packing_rows_keeps_a_clashing_serial_readable(packed_mode: None) -> None:
+    with TestingSessionLocal() as db:
+        packed = models.Vehicle(license_plate="CL 001 AA")
+        packed.wheel_positions = [models.WheelPosition(position_index=1, tire_serial="CLASH-1")]
+        db.add(packed)
+        db.flush()
+        wheel_packing.merge_rows(db, packed)
+        db.commit()
+        # Row-mode data the row index could not check against the pack.
+        stale = models.Vehicle(license_plate="CL 002 AA")
+        stale.wheel_positions = [
+            models.WheelPosition(position_index=1, tire_serial="CLASH-1"),
+            models.WheelPosition(position_index=2, tire_serial="CLASH-2"),
+        ]
+        db.add(stale)
+        db.commit()
+
+        # Reading the vehicle must not fail on every attempt.
+        for _ in range(2):
+            positions = crud.get_wheel_positions(db, stale)
+        assert [p.tire_serial for p in positions[:2]] == [None, "CLASH-2"]
+        leftover = db.query(models.WheelPosition).filter(
+            models.WheelPosition.vehicle_id == stale.id
+        )
+        assert [wp.tire_serial for wp in leftover] == ["CLASH-1"]
+        crud.delete_vehicle(db, stale)
+        crud.delete_vehicle(db, packed)
+
+
+def test_pack_all_merges_rows_into_existing_pack() -> None:
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        vehicle = models.Vehicle(license_plate="MG 001 AA")
+        vehicle.wheel_positions = [
+            models.WheelPosition(position_index=1, tire_serial="ROW-1"),
+            models.WheelPosition(position_index=2, tire_serial="ROW-2"),
+        ]
+        db.add(vehicle)
+        db.flush()
+        positions = wheel_packing.unpack(models.VehicleWheelPack(vehicle_id=vehicle.id, positions="[]"))
+        positions[1].tire_serial = "PACK-2"
+        vehicle.wheel_pack = models.VehicleWheelPack(positions=wheel_packing.pack(positions))
+        db.commit()
+
+    assert wheel_packing.pack_all(engine) == 1
+    with Session(engine) as db:
+        assert db.query(models.WheelPosition).count() == 0
+        positions = wheel_packing.unpack(db.query(models.VehicleWheelPack).one())
+        assert positions[0].tire_serial == "ROW-1"
+        assert positions[1].tire_serial == "PACK-2"
+    assert wheel_packing.pack_all(engine) == 0
+
+
+def test_migration_indexes_serials_of_existing_packs() -> None:
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    models.Base.metadata.create_all(bind=engine)
+    models.PackedTireSerial.__table__.drop(bind=engine)
+    with Session(engine) as db:
+        for plate, serial in (("MI 001 AA", "MI-1"), ("MI 002 AA", "MI-1")):
+            vehicle = models.Vehicle(license_plate=plate)
+            db.add(vehicle)
+            db.flush()
+            positions = wheel_packing.unpack(
+                models.VehicleWheelPack(vehicle_id=vehicle.id, positions="[]")
+            )
+            positions[0].tire_serial = serial
+            db.add(
+                models.VehicleWheelPack(
+                    vehicle_id=vehicle.id, positions=wheel_packing.pack(positions), version=1
+                )
+            )
+        db.commit()
+
+    migrations.apply_migrations(engine)
+    with Session(engine) as db:
+        serial = db.query(models.PackedTireSerial).one()
+        assert (serial.tire_serial, serial.position_index) == ("MI-1", 1)
+
+
+def test_packed_write_touches_only_changed_serials(
+    client: TestClient, packed_mode: None
+) -> None:
+    headers = authenticate(client)
+    vehicle_id = client.post(
+        "/vehicles", json={"license_plate": "PK 300 AA"}, headers=headers
+    ).json()["id"]
+    client.post(
+        f"/vehicles/{vehicle_id}/wheel-positions/bulk",
+        json={
+            "positions": [
+                {"position_index": index, "tire_serial": f"FULL-{index}"}
+                for index in range(1, 25)
+            ]
+        },
+        headers=headers,
+    )
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        if "packed_tire_serials" in statement:
+            statements.append(statement.split()[0])
+
+    event.listen(conftest.engine, "before_cursor_execute", record)
+    try:
+        response = client.put(
+            f"/vehicles/{vehicle_id}/wheel-positions/7",
+            json={"tire_serial": "SWAP-7"},
+            headers=headers,
+        )
+    finally:
+        event.remove(conftest.engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    # One conflict lookup, then delete the old serial and insert the new one;
+    # the other 23 serials of the vehicle are never loaded.
+    assert sorted(statements) == ["DELETE", "INSERT", "SELECT"]